@@ -1,63 +1,365 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from app.services.analytics_service import AnalyticsService
-from app.services.data_service import DataService
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Request, Query, Body, Header, Depends
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from app.services.ingestion_service import IngestionBusyError
+from app.services.data_service import InsufficientDataError
+from app.services.tenant_registry import TenantRegistry, Tenant, UnknownTenantError, DEFAULT_TENANT
+from app.services.load_control import LoadControl, EndpointPolicy
+from app.utils.deadline import to_thread, current_budget
+import asyncio
+import json
+from contextlib import asynccontextmanager
+import time
+from datetime import date
+from typing import List
 import logging
+import os
 
-router = APIRouter()
-analytics_service = AnalyticsService()
-data_service = DataService()
+# (deadline seconds, max concurrent) per endpoint; all well inside the dashboard's 30s client timeout.
+# Streams, ingestion and exports are unguarded: they are long-lived or already bounded.
+ENDPOINT_LIMITS = {
+    'get_dashboard_overview': (5, 16),
+    'get_sales_forecast': (10, 4),
+    'get_forecast_backtest': (25, 2),
+    'get_customer_segmentation': (20, 4),
+    'get_sentiment_analysis': (20, 4),
+    'get_worst_products': (10, 8),
+    'get_sentiment_trend': (10, 8),
+    'get_churn_prediction': (20, 4),
+    'get_churn_calibration': (25, 2),
+    'get_customer': (5, 16),
+    'score_customers': (10, 8),
+    'get_analytics_summary': (25, 2),
+    'get_active_customers': (5, 16),
+    'get_model_drift': (25, 2)
+}
+# Endpoints that answer with their last good result instead of a 503/504: comma-separated names, or '*'
+_serve_stale = {name.strip() for name in os.getenv('SERVE_STALE_ENDPOINTS', '').split(',') if name.strip()}
+load_control = LoadControl({
+    name: EndpointPolicy(deadline, max_concurrent, serve_stale='*' in _serve_stale or name in _serve_stale)
+    for name, (deadline, max_concurrent) in ENDPOINT_LIMITS.items()
+})
+
+router = APIRouter(route_class=load_control.route_class())
+admin_router = APIRouter()
+tenant_registry = TenantRegistry(
+    snapshot_dir=os.getenv('TENANT_SNAPSHOT_DIR', 'tenant_snapshots'),
+    # Covers tenant data, indexes and derived tables; fitted models and score caches come on top
+    memory_budget=int(float(os.getenv('TENANT_MEMORY_BUDGET_MB', '1024')) * 2 ** 20),
+    scoring_interval=float(os.getenv('SCORING_INTERVAL', '300')),
+    # Tenants that exist without data or a snapshot; others are created by their first ingest
+    tenants=[tenant.strip() for tenant in os.getenv('TENANTS', '').split(',') if tenant.strip()]
+)
+
+@asynccontextmanager
+async def _use_tenant(request, x_tenant_id, create):
+    tenant_id = request.path_params.get('tenant_id') or x_tenant_id or DEFAULT_TENANT
+    try:
+        tenant = await tenant_registry.acquire(tenant_id, create=create)
+    except UnknownTenantError:
+        raise HTTPException(status_code=404, detail=f"Unknown tenant '{tenant_id}'")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Taken now: dependency teardown may run outside the request's context
+    budget = current_budget()
+    start = time.perf_counter()
+    try:
+        yield tenant
+    finally:
+        def release():
+            tenant_registry.release(tenant, time.perf_counter() - start)
+
+        if budget is None:
+            release()
+        else:
+            # Threads of an abandoned request still read this tenant, so it stays pinned until they return
+            budget.when_idle(release)
+
+async def get_tenant(request: Request, x_tenant_id: str = Header(None)):
+    """Tenant named by the /tenants/{tenant_id} path prefix or the X-Tenant-ID header, else the default"""
+    async with _use_tenant(request, x_tenant_id, create=False) as tenant:
+        yield tenant
+
+async def get_or_create_tenant(request: Request, x_tenant_id: str = Header(None)):
+    """Like get_tenant, but creates an empty tenant the first time an ID is written to"""
+    async with _use_tenant(request, x_tenant_id, create=True) as tenant:
+        yield tenant
 
 @router.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "AI Business Insights API"}
 
 @router.get("/dashboard/overview")
-async def get_dashboard_overview():
-    """Get high-level business metrics"""
+async def get_dashboard_overview(start: date = None, end: date = None, as_of: date = None,
+                                 tenant: Tenant = Depends(get_tenant)):
+    """Get high-level business metrics, all-time or for an inclusive start/end window or as of a date"""
     try:
-        overview = await analytics_service.get_business_overview()
+        overview = await tenant.analytics_service.get_business_overview(start, end, as_of)
         return overview
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/dashboard/all")
+async def get_dashboard_all(periods: int = 30, panels: str = None, tenant: Tenant = Depends(get_tenant)):
+    """Stream every dashboard panel as NDJSON, one line per panel as soon as it is ready"""
+    requested = [panel.strip() for panel in panels.split(',') if panel.strip()] if panels else None
+    stream = tenant.analytics_service.stream_dashboard(requested, periods)
+    try:
+        # Pull the first panel eagerly so bad panel names surface as a 400, not a broken stream
+        first = await stream.__anext__()
+    except StopAsyncIteration:
+        first = None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def encode():
+        if first is not None:
+            yield json.dumps(jsonable_encoder(first)) + "\n"
+        async for message in stream:
+            yield json.dumps(jsonable_encoder(message)) + "\n"
+
+    return StreamingResponse(encode(), media_type="application/x-ndjson")
+
+@router.get("/dashboard/stream")
+async def stream_dashboard_updates(request: Request, tenant: Tenant = Depends(get_tenant)):
+    """Server-sent events: a full snapshot on connect, then only the panels that changed"""
+    try:
+        queue = await tenant.dashboard_publisher.subscribe()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            tenant.dashboard_publisher.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/forecast/sales")
-async def get_sales_forecast(periods: int = 30):
+async def get_sales_forecast(periods: int = 30, tenant: Tenant = Depends(get_tenant)):
     """Get sales forecasting results"""
     try:
-        forecast = await analytics_service.generate_sales_forecast(periods)
+        forecast = await tenant.analytics_service.generate_sales_forecast(periods)
         return forecast
+    except InsufficientDataError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/forecast/backtest")
+async def get_forecast_backtest(horizon: int = 30, min_train: int = 30, step: int = 1, by_category: bool = False,
+                                tenant: Tenant = Depends(get_tenant)):
+    """Rolling-origin backtest of the sales forecast: MAPE, RMSE and interval coverage"""
+    try:
+        return await tenant.analytics_service.get_forecast_backtest(horizon, min_train, step, by_category)
+    except InsufficientDataError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/segmentation/customers")
-async def get_customer_segmentation():
-    """Get customer segmentation analysis"""
+async def get_customer_segmentation(request: Request, tenant: Tenant = Depends(get_tenant)):
+    """Get customer segmentation analysis (ETag-validated, compressed)"""
     try:
-        segmentation = await analytics_service.analyze_customer_segments()
-        return segmentation
+        return await tenant.response_cache.respond(
+            request, 'segmentation', tenant.analytics_service.scoring_version(),
+            tenant.analytics_service.analyze_customer_segments
+        )
+    except InsufficientDataError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/sentiment/analysis")
-async def get_sentiment_analysis():
+async def get_sentiment_analysis(tenant: Tenant = Depends(get_tenant)):
     """Get product review sentiment analysis"""
     try:
-        sentiment = await analytics_service.analyze_sentiment()
+        sentiment = await tenant.analytics_service.analyze_sentiment()
         return sentiment
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/sentiment/products/worst")
+async def get_worst_products(n: int = 10, min_reviews: int = 5, start: date = None, end: date = None,
+                             tenant: Tenant = Depends(get_tenant)):
+    """Products with the highest share of negative reviews, optionally within a date window"""
+    try:
+        return await tenant.analytics_service.get_worst_products(n, min_reviews, start, end)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/sentiment/trend")
+async def get_sentiment_trend(product_id: str = None, start: date = None, end: date = None,
+                              tenant: Tenant = Depends(get_tenant)):
+    """Weekly sentiment counts for one product, or for all products when none is given"""
+    try:
+        return await tenant.analytics_service.get_sentiment_trend(product_id, start, end)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown product '{product_id}'")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/churn/prediction")
-async def get_churn_prediction():
-    """Get customer churn predictions"""
+async def get_churn_prediction(request: Request, tenant: Tenant = Depends(get_tenant)):
+    """Get customer churn predictions (ETag-validated, compressed)"""
     try:
-        churn_analysis = await analytics_service.predict_churn()
-        return churn_analysis
+        return await tenant.response_cache.respond(
+            request, 'churn', tenant.analytics_service.scoring_version(),
+            tenant.analytics_service.predict_churn
+        )
+    except InsufficientDataError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/churn/calibration")
+async def get_churn_calibration(bins: int = 10, points: int = 50, top: int = 10, tenant: Tenant = Depends(get_tenant)):
+    """Precision/recall/lift per threshold, reliability bins and rule cut-off search against observed churn"""
+    try:
+        return await tenant.analytics_service.get_churn_calibration(bins, points, top)
+    except InsufficientDataError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/churn/risk-thresholds")
+async def set_churn_risk_thresholds(medium: float = Body(...), high: float = Body(...),
+                                    tenant: Tenant = Depends(get_tenant)):
+    """Move the probability cut-offs for Medium and High churn risk"""
+    try:
+        return await tenant.analytics_service.set_churn_risk_thresholds(medium, high)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+MAX_CUSTOMER_BATCH = 10000
+
+@router.get("/customers/{customer_id}")
+async def get_customer(customer_id: str, tenant: Tenant = Depends(get_tenant)):
+    """Churn risk and segment of one customer"""
+    try:
+        result = await to_thread(tenant.analytics_service.score_customers, [customer_id])
+    except InsufficientDataError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not result['customers']:
+        raise HTTPException(status_code=404, detail=f"Unknown customer '{customer_id}'")
+    return result['customers'][0]
+
+@router.post("/customers/batch")
+async def score_customers(customer_ids: List[str] = Body(..., embed=True), tenant: Tenant = Depends(get_tenant)):
+    """Churn risk and segment for a list of customer IDs, scored in one call"""
+    if len(customer_ids) > MAX_CUSTOMER_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_CUSTOMER_BATCH} customer IDs per batch")
+    try:
+        return await to_thread(tenant.analytics_service.score_customers, customer_ids)
+    except InsufficientDataError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/export/customers")
+async def export_customers(format: str = 'csv', columns: str = None,
+                           risk_level: List[str] = Query(None), cluster: List[int] = Query(None),
+                           order: str = 'customer', tenant: Tenant = Depends(get_tenant)):
+    """Stream every customer's churn and segment scores as CSV, NDJSON or Parquet"""
+    try:
+        table = tenant.analytics_service.scoring_table
+        if table is None:
+            table = await asyncio.to_thread(tenant.analytics_service.refresh_scoring_table)
+        selected = [column.strip() for column in columns.split(',') if column.strip()] if columns else None
+        media_type, chunks = tenant.export_service.prepare(table, format, selected, risk_level, cluster, order)
+    except InsufficientDataError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return StreamingResponse(chunks, media_type=media_type, headers={
+        'Content-Disposition': f'attachment; filename="customer_scores.{format}"'
+    })
+
+@router.get("/analytics/summary")
+async def get_analytics_summary(tenant: Tenant = Depends(get_tenant)):
+    """Get churn and segment summaries computed over sharded customer partitions"""
+    try:
+        return await tenant.analytics_service.get_sharded_summary()
+    except InsufficientDataError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/analytics/active-customers")
+async def get_active_customers(start: date = None, end: date = None,
+                               category: List[str] = Query(None), location: List[str] = Query(None),
+                               group_by: str = None, exact: bool = False, tenant: Tenant = Depends(get_tenant)):
+    """Distinct customers with orders in a window, by category and location (HyperLogLog, or exact)"""
+    try:
+        return await tenant.analytics_service.get_active_customers(start, end, category, location, group_by, exact)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/scoring/status")
+async def get_scoring_status(tenant: Tenant = Depends(get_tenant)):
+    """Last refresh time, duration and version of the precomputed scoring table"""
+    return tenant.scoring_scheduler.status()
+
+@router.get("/models/drift")
+async def get_model_drift(tenant: Tenant = Depends(get_tenant)):
+    """Per-feature drift of each model's current inputs against its training data"""
+    try:
+        return await tenant.analytics_service.get_model_drift()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/models/retrain")
-async def retrain_models(background_tasks: BackgroundTasks):
-    """Trigger model retraining"""
-    background_tasks.add_task(analytics_service.retrain_all_models)
-    return {"message": "Model retraining initiated"}
\ No newline at end of file
+async def retrain_models(background_tasks: BackgroundTasks, force: bool = False, tenant: Tenant = Depends(get_tenant)):
+    """Retrain models whose inputs drifted since training, or every model with force=true"""
+    try:
+        models = await tenant.analytics_service.models_to_retrain(force)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not models:
+        return {"message": "No model inputs drifted, or too little data to fit them; nothing to retrain", "models": []}
+    background_tasks.add_task(tenant.analytics_service.retrain_models, models)
+    return {"message": "Model retraining initiated", "models": models}
+
+@router.post("/ingest/{kind}")
+async def ingest_records(kind: str, request: Request, tenant: Tenant = Depends(get_or_create_tenant)):
+    """Stream NDJSON or Arrow IPC records (orders, customers, reviews) into the data store"""
+    try:
+        return await tenant.ingestion_service.ingest(kind, request.stream(), request.headers.get('content-type'))
+    except IngestionBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@admin_router.get("/tenants")
+async def get_tenants():
+    """Memory use against the tenant budget, and request, compute and memory usage per tenant"""
+    return tenant_registry.stats()
+
+@admin_router.get("/load")
+async def get_load():
+    """Per-endpoint concurrency, shed, deadline and stale-serve counters"""
+    return load_control.stats()
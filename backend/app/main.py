@@ -1,12 +1,23 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.routes import router
+from app.api.routes import router, admin_router, tenant_registry
 import uvicorn
 
+
+@asynccontextmanager
+async def lifespan(app):
+    # Keep per-customer scores precomputed for resident tenants while the app is serving
+    tenant_registry.start()
+    yield
+    await tenant_registry.shutdown()
+
+
 app = FastAPI(
     title="AI Business Insights API",
     description="Advanced ML-powered business analytics platform",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -18,6 +29,9 @@ app.add_middleware(
 )
 
 app.include_router(router, prefix="/api/v1")
+# Same endpoints scoped to a tenant by path; unprefixed ones use the X-Tenant-ID header
+app.include_router(router, prefix="/api/v1/tenants/{tenant_id}")
+app.include_router(admin_router, prefix="/api/v1")
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,192 @@
+import itertools
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Cut-offs of the original hand-tuned churn rules and the candidates searched around them
+DEFAULT_RULES = {'recency_high': 60, 'recency_mid': 30, 'min_spent': 100, 'min_orders': 2, 'min_aov': 50}
+DEFAULT_RULE_GRID = {
+    'recency_high': [30, 45, 60, 75, 90, 120],
+    'recency_mid': [14, 21, 30, 45],
+    'min_spent': [50, 100, 150, 200, 300],
+    'min_orders': [1, 2, 3, 5],
+    'min_aov': [25, 50, 75, 100]
+}
+# Rule score in hundredths: base 10, capped at 95
+_RULE_WEIGHTS = {'recency_high': 40, 'recency_mid': 20, 'min_spent': 30, 'min_orders': 20, 'min_aov': 10}
+_MAX_RULE_SCORE = 101
+
+
+def threshold_sweep(y_true, scores, max_points=None):
+    """Precision, recall, F1 and lift at every distinct score threshold, from one descending sort"""
+    y_true = np.asarray(y_true, dtype=np.float64)
+    scores = np.asarray(scores, dtype=np.float64)
+    order = np.argsort(-scores, kind='stable')
+    scores, y_true = scores[order], y_true[order]
+
+    # The last position of each run of equal scores is where that threshold's cut falls
+    cut = np.r_[np.flatnonzero(np.diff(scores)), len(scores) - 1]
+    true_positives = np.cumsum(y_true)[cut]
+    predicted_positives = cut + 1.0
+    positives = max(true_positives[-1], 1.0)
+    base_rate = positives / len(scores)
+
+    precision = true_positives / predicted_positives
+    recall = true_positives / positives
+    with np.errstate(invalid='ignore', divide='ignore'):
+        f1 = np.nan_to_num(2 * precision * recall / (precision + recall))
+
+    points = np.arange(len(cut))
+    if max_points and len(points) > max_points:
+        points = np.unique(np.linspace(0, len(cut) - 1, max_points).round().astype(np.int64))
+    best = int(np.argmax(f1))
+    return {
+        'base_rate': float(base_rate),
+        'best_f1_threshold': float(scores[cut[best]]),
+        'best_f1': float(f1[best]),
+        'curve': [
+            {
+                'threshold': round(float(scores[cut[i]]), 6),
+                'precision': round(float(precision[i]), 4),
+                'recall': round(float(recall[i]), 4),
+                'f1': round(float(f1[i]), 4),
+                'lift': round(float(precision[i] / base_rate), 4),
+                'flagged': int(predicted_positives[i])
+            }
+            for i in points
+        ]
+    }
+
+
+def reliability_bins(y_true, probabilities, n_bins=10):
+    """Mean predicted vs observed churn per equal-width probability bin, plus expected calibration error"""
+    y_true = np.asarray(y_true, dtype=np.float64)
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    bins = np.minimum((probabilities * n_bins).astype(np.int64), n_bins - 1)
+    counts = np.bincount(bins, minlength=n_bins)
+    predicted = np.bincount(bins, weights=probabilities, minlength=n_bins)
+    observed = np.bincount(bins, weights=y_true, minlength=n_bins)
+
+    nonempty = counts > 0
+    mean_predicted = np.divide(predicted, counts, out=np.zeros(n_bins), where=nonempty)
+    observed_rate = np.divide(observed, counts, out=np.zeros(n_bins), where=nonempty)
+    ece = float(np.sum(counts * np.abs(mean_predicted - observed_rate)) / max(len(probabilities), 1))
+    return {
+        'expected_calibration_error': round(ece, 4),
+        'bins': [
+            {
+                'lower': i / n_bins,
+                'upper': (i + 1) / n_bins,
+                'count': int(counts[i]),
+                'mean_predicted': round(float(mean_predicted[i]), 4),
+                'observed_rate': round(float(observed_rate[i]), 4)
+            }
+            for i in range(n_bins) if nonempty[i]
+        ]
+    }
+
+
+def _auc_from_histograms(positive_hist, negative_hist):
+    """Exact ROC AUC (ties count half) from per-score class histograms, one row per candidate"""
+    negatives_below = np.cumsum(negative_hist, axis=1) - negative_hist
+    positives = positive_hist.sum(axis=1)
+    negatives = negative_hist.sum(axis=1)
+    wins = np.sum(positive_hist * (negatives_below + 0.5 * negative_hist), axis=1)
+    return wins / np.maximum(positives * negatives, 1)
+
+
+def rule_grid_search(features, y_true, grid=None, decision_threshold=0.5, top=10, max_cells=2 ** 22):
+    """Evaluate every combination of rule cut-offs against observed churn.
+
+    Customers are bucketed once by where each feature falls among the grid's
+    cut-offs, and churned/retained customers are counted per joint bucket. A
+    candidate's rule score is constant within a bucket, so every candidate is
+    scored as one (candidates x buckets) integer matrix and reduced to per-score
+    class histograms, from which AUC, precision and recall follow without sorting.
+    """
+    grid = {**DEFAULT_RULE_GRID, **(grid or {})}
+    y = np.asarray(y_true, dtype=bool)
+    names = list(DEFAULT_RULE_GRID)
+
+    # Recency rules fire when days > cut-off; the others when value < cut-off
+    recency_cuts = np.unique(np.concatenate([grid['recency_high'], grid['recency_mid']]).astype(np.float64))
+    feature_cuts = {
+        'recency': recency_cuts,
+        'min_spent': np.unique(np.asarray(grid['min_spent'], dtype=np.float64)),
+        'min_orders': np.unique(np.asarray(grid['min_orders'], dtype=np.float64)),
+        'min_aov': np.unique(np.asarray(grid['min_aov'], dtype=np.float64))
+    }
+    columns = {'recency': 'days_since_last_order', 'min_spent': 'total_spent',
+               'min_orders': 'order_count', 'min_aov': 'avg_order_value'}
+    buckets = {
+        key: np.searchsorted(cuts, features[columns[key]].to_numpy(dtype=np.float64),
+                             side='left' if key == 'recency' else 'right')
+        for key, cuts in feature_cuts.items()
+    }
+    sizes = [len(cuts) + 1 for cuts in feature_cuts.values()]
+    cell = np.ravel_multi_index(tuple(buckets.values()), sizes)
+    positives_per_cell = np.bincount(cell[y], minlength=int(np.prod(sizes)))
+    negatives_per_cell = np.bincount(cell[~y], minlength=int(np.prod(sizes)))
+    occupied = np.flatnonzero(positives_per_cell + negatives_per_cell)
+    cell_buckets = dict(zip(feature_cuts, np.unravel_index(occupied, sizes)))
+    positives_per_cell, negatives_per_cell = positives_per_cell[occupied], negatives_per_cell[occupied]
+
+    candidates = np.array([
+        combo for combo in itertools.product(*(range(len(grid[name])) for name in names))
+        if grid['recency_mid'][combo[1]] < grid['recency_high'][combo[0]]
+    ], dtype=np.int64).reshape(-1, len(names))
+    # Position of each candidate's cut-off within its feature's sorted cut list
+    cut_index = {
+        name: np.searchsorted(feature_cuts['recency' if name.startswith('recency') else name],
+                              np.asarray(grid[name], dtype=np.float64))[candidates[:, j]][:, np.newaxis]
+        for j, name in enumerate(names)
+    }
+
+    n_cells = len(occupied)
+    block = max(1, min(len(candidates), max_cells // max(n_cells, 1)))
+    positive_hist = np.zeros((len(candidates), _MAX_RULE_SCORE), dtype=np.float64)
+    negative_hist = np.zeros((len(candidates), _MAX_RULE_SCORE), dtype=np.float64)
+
+    for start in range(0, len(candidates), block):
+        rows = slice(start, start + block)
+        n_rows = len(candidates[rows])
+        high = cell_buckets['recency'] > cut_index['recency_high'][rows]
+        mid = (cell_buckets['recency'] > cut_index['recency_mid'][rows]) & ~high
+        score = (10 + _RULE_WEIGHTS['recency_high'] * high + _RULE_WEIGHTS['recency_mid'] * mid
+                 + _RULE_WEIGHTS['min_spent'] * (cell_buckets['min_spent'] <= cut_index['min_spent'][rows])
+                 + _RULE_WEIGHTS['min_orders'] * (cell_buckets['min_orders'] <= cut_index['min_orders'][rows])
+                 + _RULE_WEIGHTS['min_aov'] * (cell_buckets['min_aov'] <= cut_index['min_aov'][rows]))
+        np.minimum(score, 95, out=score)
+
+        # One weighted bincount per block: each candidate's cells land in its own histogram row
+        keys = (score + np.arange(n_rows)[:, np.newaxis] * _MAX_RULE_SCORE).ravel()
+        size = n_rows * _MAX_RULE_SCORE
+        positive_hist[rows] = np.bincount(keys, weights=np.tile(positives_per_cell, n_rows), minlength=size).reshape(n_rows, -1)
+        negative_hist[rows] = np.bincount(keys, weights=np.tile(negatives_per_cell, n_rows), minlength=size).reshape(n_rows, -1)
+
+    auc = _auc_from_histograms(positive_hist, negative_hist)
+    cutoff = int(round(decision_threshold * 100))
+    flagged_positive = positive_hist[:, cutoff:].sum(axis=1)
+    flagged = flagged_positive + negative_hist[:, cutoff:].sum(axis=1)
+    precision = np.divide(flagged_positive, flagged, out=np.zeros(len(candidates)), where=flagged > 0)
+    recall = flagged_positive / max(int(y.sum()), 1)
+
+    def describe(i):
+        return {
+            'rules': {name: grid[name][candidates[i, j]] for j, name in enumerate(names)},
+            'auc': round(float(auc[i]), 4),
+            'precision': round(float(precision[i]), 4),
+            'recall': round(float(recall[i]), 4)
+        }
+
+    default = [i for i in range(len(candidates))
+               if all(grid[name][candidates[i, j]] == DEFAULT_RULES[name] for j, name in enumerate(names))]
+    ranked = np.lexsort((-recall, -auc))[:top]
+    logger.info(f"Rule grid search evaluated {len(candidates)} candidates over {len(y)} customers ({n_cells} buckets)")
+    return {
+        'candidates_evaluated': int(len(candidates)),
+        'decision_threshold': decision_threshold,
+        'default': describe(default[0]) if default else None,
+        'best': [describe(i) for i in ranked]
+    }
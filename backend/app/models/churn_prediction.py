@@ -1,15 +1,33 @@
 import pandas as pd
 import numpy as np
 import logging
+from app.models.logistic_regression import LogisticRegression
+from app.utils.drift import DriftMonitor
+from app.utils.deadline import deadline_active
 
 logger = logging.getLogger(__name__)
 
+RISK_LEVELS = ['Low', 'Medium', 'High']
+DEFAULT_RISK_THRESHOLDS = (0.3, 0.7)
+
 class ChurnPredictor:
-    def __init__(self):
+    def __init__(self, risk_thresholds=DEFAULT_RISK_THRESHOLDS):
         self.model = None
         self.scaler_params = None
         self.feature_names = None
         self.is_fitted = False
+        self.drift_reference = None
+        self.set_risk_thresholds(*risk_thresholds)
+
+    def set_risk_thresholds(self, medium, high):
+        """Probability cut-offs above which a customer is Medium and High risk"""
+        if not 0 < medium < high < 1:
+            raise ValueError("Risk thresholds must satisfy 0 < medium < high < 1")
+        self.risk_thresholds = (float(medium), float(high))
+
+    def risk_level_codes(self, probabilities):
+        """Index into RISK_LEVELS per probability; a probability equal to a cut-off stays in the lower band"""
+        return np.searchsorted(self.risk_thresholds, probabilities, side='left')
     
     def prepare_features(self, customer_data):
         """Prepare features for churn prediction"""
@@ -26,7 +44,7 @@ class ChurnPredictor:
         features['spending_velocity'] = features['total_spent'] / (features['customer_lifetime_days'] + 1)
         
         # Encode categorical variables
-        features['gender_encoded'] = features['gender'].map({'M': 1, 'F': 0}).fillna(0)
+        features['gender_encoded'] = (features['gender'] == 'M').astype(int)
         
         # Select features for modeling
         feature_columns = [
@@ -37,134 +55,91 @@ class ChurnPredictor:
         
         return features[feature_columns].fillna(0)
     
-    def train(self, customer_data):
-        """Train churn prediction model (mock implementation)"""
+    def _scale(self, X):
+        """Standardize features with the stored scaler parameters"""
+        mean = np.array([self.scaler_params['mean'][f] for f in self.feature_names])
+        std = np.array([self.scaler_params['std'][f] for f in self.feature_names])
+        std[~(std > 0)] = 1.0
+        return (np.asarray(X, dtype=np.float64) - mean) / std
+
+    def train(self, customer_data, features=None):
+        """Train logistic-regression churn model on standardized features"""
         try:
             logger.info("Training churn prediction model...")
 
-            X = self.prepare_features(customer_data)
+            X = self.prepare_features(customer_data) if features is None else features
             y = customer_data['is_churned'].astype(int) if 'is_churned' in customer_data.columns else np.random.randint(0, 2, len(customer_data))
 
-            # Mock training - store basic statistics
             self.scaler_params = {
                 'mean': X.mean().to_dict(),
                 'std': X.std().to_dict()
             }
-
-            # Create simple rule-based model
-            self.model = self._create_rule_based_churn_model(X, y)
             self.feature_names = X.columns.tolist()
+            # Training-time histograms that live feature monitors are compared against
+            self.drift_reference = DriftMonitor(self.scaler_params['mean'], self.scaler_params['std']).update(X)
+
+            self.model = LogisticRegression().fit(self._scale(X), np.asarray(y))
             self.is_fitted = True
 
-            logger.info("Churn prediction model trained successfully (mock)")
+            logger.info("Churn prediction model trained successfully")
 
             return {
-                'auc_score': 0.75,  # Mock AUC score
-                'feature_importance': self._get_mock_feature_importance()
+                'auc_score': self.model.validation_auc_,
+                'feature_importance': self._get_feature_importance()
             }
 
         except Exception as e:
             logger.error(f"Error training churn model: {str(e)}")
             raise
     
-    def predict_churn(self, customer_data):
+    def predict_proba(self, features):
+        """Churn probabilities for prepared feature rows"""
+        return self.model.predict_proba(self._scale(features[self.feature_names]))
+
+    def predict_churn(self, customer_data, features=None):
         """Predict customer churn probability"""
         try:
             if not self.is_fitted:
                 return self._generate_mock_predictions(customer_data)
 
-            X = self.prepare_features(customer_data)
-
-            # Apply rule-based predictions
-            churn_probabilities = []
-            for _, row in X.iterrows():
-                prob = self._calculate_churn_probability(row)
-                churn_probabilities.append(prob)
-
-            churn_probabilities = np.array(churn_probabilities)
+            if features is None:
+                features = self.prepare_features(customer_data)
+            churn_probabilities = self.predict_proba(features)
 
             # Create predictions dataframe
             predictions_df = customer_data.copy()
             predictions_df['churn_probability'] = churn_probabilities
-            predictions_df['risk_level'] = pd.cut(
-                churn_probabilities,
-                bins=[0, 0.3, 0.7, 1.0],
-                labels=['Low', 'Medium', 'High']
-            )
+            predictions_df['risk_level'] = np.asarray(RISK_LEVELS, dtype=object)[self.risk_level_codes(churn_probabilities)]
 
             # Sort by churn probability (highest risk first)
             predictions_df = predictions_df.sort_values('churn_probability', ascending=False)
 
-            # Get feature importance
-            feature_importance = self._get_mock_feature_importance()
-
             return {
                 'predictions': predictions_df[['customer_id', 'churn_probability', 'risk_level']].to_dict('records') if 'customer_id' in predictions_df.columns else [],
-                'feature_importance': feature_importance,
-                'overall_churn_rate': float(churn_probabilities.mean()),
-                'note': 'Mock predictions - install scikit-learn for advanced ML models'
+                'feature_importance': self._get_feature_importance(),
+                'overall_churn_rate': float(churn_probabilities.mean())
             }
 
         except Exception as e:
             logger.error(f"Error predicting churn: {str(e)}")
+            if deadline_active():
+                raise
             return self._generate_mock_predictions(customer_data)
 
-    def _create_rule_based_churn_model(self, X, y):
-        """Create a simple rule-based churn model"""
-        return {
-            'type': 'rule_based',
-            'rules': {
-                'days_since_last_order_threshold': 60,
-                'low_spending_threshold': X['total_spent'].quantile(0.25),
-                'low_frequency_threshold': X['order_count'].quantile(0.25)
-            }
-        }
-
-    def _calculate_churn_probability(self, customer_features):
-        """Calculate churn probability using simple rules"""
-        prob = 0.1  # Base probability
-
-        # Days since last order
-        if customer_features.get('days_since_last_order', 0) > 60:
-            prob += 0.4
-        elif customer_features.get('days_since_last_order', 0) > 30:
-            prob += 0.2
-
-        # Total spending
-        if customer_features.get('total_spent', 0) < 100:
-            prob += 0.3
-
-        # Order frequency
-        if customer_features.get('order_count', 0) < 2:
-            prob += 0.2
-
-        # Average order value
-        if customer_features.get('avg_order_value', 0) < 50:
-            prob += 0.1
-
-        return min(0.95, prob)  # Cap at 95%
-
-    def _get_mock_feature_importance(self):
-        """Get mock feature importance"""
-        if not self.feature_names:
+    def _get_feature_importance(self):
+        """Feature importance from the magnitude of standardized coefficients"""
+        if not self.feature_names or self.model is None:
             return []
 
-        # Mock importance scores
-        importance_map = {
-            'days_since_last_order': 0.25,
-            'total_spent': 0.20,
-            'order_count': 0.18,
-            'avg_order_value': 0.15,
-            'customer_lifetime_days': 0.12,
-            'avg_days_between_orders': 0.06,
-            'spending_velocity': 0.04
-        }
-
-        feature_importance = []
-        for feature in self.feature_names:
-            importance = importance_map.get(feature, 0.01)
-            feature_importance.append({'feature': feature, 'importance': importance})
+        weights = np.abs(self.model.coef_)
+        total = weights.sum()
+        if total > 0:
+            weights = weights / total
 
+        feature_importance = [
+            {'feature': feature, 'importance': round(float(weight), 4)}
+            for feature, weight in zip(self.feature_names, weights)
+        ]
         feature_importance.sort(key=lambda x: x['importance'], reverse=True)
         return feature_importance
 
@@ -178,11 +153,7 @@ class ChurnPredictor:
             churn_probabilities = np.random.beta(2, 5, num_customers)  # Skewed towards lower probabilities
 
             # Create risk levels
-            risk_levels = pd.cut(
-                churn_probabilities,
-                bins=[0, 0.3, 0.7, 1.0],
-                labels=['Low', 'Medium', 'High']
-            )
+            risk_levels = np.asarray(RISK_LEVELS, dtype=object)[self.risk_level_codes(churn_probabilities)]
 
             # Create mock predictions
             predictions = []
@@ -198,7 +169,7 @@ class ChurnPredictor:
 
             return {
                 'predictions': predictions,
-                'feature_importance': self._get_mock_feature_importance(),
+                'feature_importance': self._get_feature_importance(),
                 'overall_churn_rate': float(churn_probabilities.mean()),
                 'note': 'Mock data - train model for real churn predictions'
             }
@@ -1,94 +1,211 @@
 import pandas as pd
 import numpy as np
 import logging
+from app.models.kmeans import KMeans, silhouette_score
+from app.utils.sketches import KLLSketch
+from app.utils.drift import DriftMonitor
+from app.utils.deadline import deadline_active
 
 logger = logging.getLogger(__name__)
 
+RFM_SCORE_FEATURES = ['recency', 'frequency', 'monetary']
+# Order amounts are stored as float32, so sums carry noise below a cent until rounded for output
+RFM_MONEY_FEATURES = ['monetary', 'avg_order_value']
+QUINTILES = [0.2, 0.4, 0.6, 0.8]
+
+
+class RFMQuantiles:
+    """Mergeable quantile sketches of recency, frequency and monetary for quintile scoring"""
+
+    def __init__(self, k=200, seed=0):
+        self.sketches = {feature: KLLSketch(k, seed=seed) for feature in RFM_SCORE_FEATURES}
+
+    def update(self, rfm):
+        for feature, sketch in self.sketches.items():
+            sketch.update(rfm[feature].to_numpy(dtype=np.float64))
+        return self
+
+    def merge(self, other):
+        for feature, sketch in self.sketches.items():
+            sketch.merge(other.sketches[feature])
+        return self
+
+    def boundaries(self):
+        """Inner quintile cut points per feature"""
+        return {feature: sketch.quantiles(QUINTILES) for feature, sketch in self.sketches.items()}
+
+
 class CustomerSegmentation:
-    def __init__(self, n_clusters=4):
+    def __init__(self, n_clusters=4, n_init=4, batch_size=4096, n_jobs=1):
         self.n_clusters = n_clusters
+        self.n_init = n_init
+        self.batch_size = batch_size
+        self.n_jobs = n_jobs
         self.model = None
         self.scaler_params = None
         self.is_fitted = False
         self.feature_names = None
+        self.drift_reference = None
         
-    def create_rfm_features(self, df):
-        """Create RFM (Recency, Frequency, Monetary) features"""
-        current_date = df['order_date'].max()
-        
-        rfm = df.groupby('customer_id').agg({
-            'order_date': lambda x: (current_date - x.max()).days,  # Recency
-            'order_id': 'count',  # Frequency
-            'total_amount': 'sum'  # Monetary
-        }).reset_index()
-        
-        rfm.columns = ['customer_id', 'recency', 'frequency', 'monetary']
-        
+    def create_rfm_features(self, df, current_date=None, scores=True, boundaries=None):
+        """Create RFM (Recency, Frequency, Monetary) features; scores=False skips the population quintile scores.
+
+        Quintile boundaries come from RFMQuantiles sketches over these rows unless
+        precomputed (e.g. merged across shards) boundaries are passed in.
+        """
+        if 'order_date' in df.columns:
+            if current_date is None:
+                current_date = df['order_date'].max()
+
+            rfm = df.groupby('customer_id').agg({
+                'order_date': 'max',  # Recency
+                'order_id': 'count',  # Frequency
+                'total_amount': 'sum'  # Monetary
+            }).reset_index()
+
+            rfm.columns = ['customer_id', 'recency', 'frequency', 'monetary']
+            rfm['recency'] = (current_date - rfm['recency']).dt.days
+        else:
+            # Customer table already carries per-customer order aggregates; customers who
+            # never ordered have no recency (NaN), rather than looking like today's buyers
+            rfm = pd.DataFrame({
+                'customer_id': df['customer_id'].values,
+                'recency': df['days_since_last_order'].where(df['order_count'] > 0).to_numpy(dtype=np.float64),
+                'frequency': df['order_count'].values,
+                'monetary': df['total_spent'].values
+            })
+
         # Add additional features
-        rfm['avg_order_value'] = rfm['monetary'] / rfm['frequency']
-        rfm['recency_score'] = pd.qcut(rfm['recency'], 5, labels=[5,4,3,2,1])
-        rfm['frequency_score'] = pd.qcut(rfm['frequency'].rank(method='first'), 5, labels=[1,2,3,4,5])
-        rfm['monetary_score'] = pd.qcut(rfm['monetary'], 5, labels=[1,2,3,4,5])
-        
-        return rfm
+        rfm['avg_order_value'] = rfm['monetary'] / rfm['frequency'].where(rfm['frequency'] > 0, 1)
+        if not scores:
+            return rfm
+        if boundaries is None:
+            boundaries = RFMQuantiles().update(rfm).boundaries()
+        return self.score_rfm(rfm, boundaries)
+
+    def score_rfm(self, rfm, boundaries):
+        """Assign 1-5 quintile scores by binary search against per-feature boundaries"""
+        # side='left' puts values equal to a cut point in the lower quintile, as right-closed bins do;
+        # NaN recency sorts past every cut point, so customers without orders score least recent
+        quintile = {
+            feature: np.searchsorted(boundaries[feature], rfm[feature].to_numpy(dtype=np.float64), side='left')
+            for feature in RFM_SCORE_FEATURES
+        }
+        return rfm.assign(
+            recency_score=(5 - quintile['recency']).astype(np.int8),  # more recent scores higher
+            frequency_score=(1 + quintile['frequency']).astype(np.int8),
+            monetary_score=(1 + quintile['monetary']).astype(np.int8)
+        )
+
+    def _fill_missing(self, X):
+        """Replace missing values (recency of customers without orders) with the training-time fill"""
+        fill = np.array([self.scaler_params['fill'][f] for f in self.feature_names])
+        X = np.asarray(X, dtype=np.float64)
+        return np.where(np.isnan(X), fill, X)
+
+    def _scale(self, X):
+        """Standardize features with the stored scaler parameters"""
+        mean = np.array([self.scaler_params['mean'][f] for f in self.feature_names])
+        std = np.array([self.scaler_params['std'][f] for f in self.feature_names])
+        std[std == 0] = 1.0
+        return (self._fill_missing(X) - mean) / std
     
-    def train(self, customer_data):
-        """Train clustering model (mock implementation)"""
+    def train(self, customer_data, rfm_features=None):
+        """Train k-means clustering model on standardized RFM features"""
         try:
             logger.info("Training customer segmentation model...")
 
-            rfm_features = self.create_rfm_features(customer_data)
+            if rfm_features is None:
+                rfm_features = self.create_rfm_features(customer_data)
             features = ['recency', 'frequency', 'monetary', 'avg_order_value']
 
             X = rfm_features[features]
+            # Customers without orders cluster as the least recent ones seen in training
+            X_filled = X.fillna({'recency': X['recency'].max()}).fillna(0.0)
 
-            # Mock scaling - store mean and std for each feature
             self.scaler_params = {
-                'mean': X.mean().to_dict(),
-                'std': X.std().to_dict()
+                'mean': X_filled.mean().to_dict(),
+                'std': X_filled.std().to_dict(),
+                'fill': X_filled.max().to_dict()
             }
-
-            # Mock clustering - use simple rule-based segmentation
-            self.model = self._create_rule_based_segments(rfm_features)
             self.feature_names = features
+            # Training-time histograms that live feature monitors are compared against; monitors
+            # skip rows with missing features, so the reference is laid out around the rest
+            observed = X.dropna()
+            self.drift_reference = DriftMonitor(observed.mean().to_dict(), observed.std().to_dict()).update(observed)
+            X_scaled = self._scale(X)
+
+            # Mini-batch updates only pay off once the data outgrows a few batches
+            batch_size = self.batch_size if len(X_scaled) > 10 * self.batch_size else None
+            kmeans = KMeans(
+                n_clusters=self.n_clusters,
+                n_init=self.n_init,
+                batch_size=batch_size,
+                n_jobs=self.n_jobs
+            ).fit(X_scaled)
+
+            # Order clusters by descending monetary center so ids are stable across retrains
+            order = np.argsort(-kmeans.cluster_centers_[:, features.index('monetary')])
+            kmeans.cluster_centers_ = kmeans.cluster_centers_[order]
+            self.model = kmeans
             self.is_fitted = True
 
-            logger.info("Customer segmentation model trained successfully (mock)")
+            labels = kmeans.predict(X_scaled)
+
+            logger.info("Customer segmentation model trained successfully")
 
             return {
-                'silhouette_score': 0.65,  # Mock score
-                'cluster_centers': self._get_mock_centers(),
-                'n_customers_per_cluster': self._count_customers_per_segment(rfm_features)
+                'silhouette_score': silhouette_score(X_scaled, labels),
+                'cluster_centers': self._get_cluster_centers(),
+                'n_customers_per_cluster': np.bincount(labels, minlength=self.n_clusters).tolist()
             }
 
         except Exception as e:
             logger.error(f"Error training segmentation model: {str(e)}")
             raise
     
-    def predict_segments(self, customer_data):
+    def assign_clusters(self, rfm_features):
+        """Nearest-center assignment against the fitted cluster centers"""
+        return self.model.predict(self._scale(rfm_features[self.feature_names]))
+
+    def predict_segments(self, customer_data, rfm_features=None):
         """Predict customer segments"""
         try:
             if not self.is_fitted:
                 return self._generate_mock_segments(customer_data)
 
-            rfm_features = self.create_rfm_features(customer_data)
+            if rfm_features is None:
+                rfm_features = self.create_rfm_features(customer_data)
 
-            # Apply rule-based segmentation
-            rfm_features['cluster'] = rfm_features.apply(self._assign_segment, axis=1)
+            rfm_features = rfm_features.assign(cluster=self.assign_clusters(rfm_features))
 
             # Create segment descriptions
             segment_summary = self.create_segment_descriptions(rfm_features)
 
             return {
-                'customer_segments': rfm_features.to_dict('records'),
-                'segment_summary': segment_summary,
-                'note': 'Mock segmentation - install scikit-learn for advanced clustering'
+                'customer_segments': self._records(rfm_features),
+                'segment_summary': segment_summary
             }
 
         except Exception as e:
             logger.error(f"Error predicting segments: {str(e)}")
+            if deadline_active():
+                raise
             return self._generate_mock_segments(customer_data)
     
+    @staticmethod
+    def _records(rfm_features):
+        """Rows as JSON-ready records, with amounts rounded to cents and missing recency as None"""
+        rfm_features = rfm_features.round({feature: 2 for feature in RFM_MONEY_FEATURES})
+        return rfm_features.astype(object).where(rfm_features.notna(), None).to_dict('records')
+
+    @staticmethod
+    def _mean(values, ndigits=None):
+        mean = values.mean()
+        if pd.isna(mean):
+            return None
+        return float(mean) if ndigits is None else round(float(mean), ndigits)
+
     def create_segment_descriptions(self, rfm_data):
         """Create human-readable segment descriptions"""
         segments = []
@@ -98,9 +215,9 @@ class CustomerSegmentation:
             segment = {
                 'cluster_id': int(cluster),
                 'size': len(cluster_data),
-                'avg_recency': float(cluster_data['recency'].mean()),
-                'avg_frequency': float(cluster_data['frequency'].mean()),
-                'avg_monetary': float(cluster_data['monetary'].mean()),
+                'avg_recency': self._mean(cluster_data['recency']),
+                'avg_frequency': self._mean(cluster_data['frequency']),
+                'avg_monetary': self._mean(cluster_data['monetary'], 2),
                 'description': self.get_segment_label(cluster_data)
             }
             segments.append(segment)
@@ -112,6 +229,9 @@ class CustomerSegmentation:
         avg_recency = cluster_data['recency'].mean()
         avg_frequency = cluster_data['frequency'].mean()
         avg_monetary = cluster_data['monetary'].mean()
+        if len(cluster_data) and pd.isna(avg_recency):
+            # Nobody in the segment has ordered yet
+            avg_recency = np.inf
 
         if avg_monetary > 1000 and avg_frequency > 5:
             return "High-Value Champions"
@@ -122,45 +242,12 @@ class CustomerSegmentation:
         else:
             return "Potential Loyalists"
 
-    def _create_rule_based_segments(self, rfm_features):
-        """Create rule-based segmentation model"""
-        return {
-            'type': 'rule_based',
-            'rules': {
-                0: {'monetary_min': 1000, 'frequency_min': 5, 'label': 'High-Value Champions'},
-                1: {'monetary_min': 500, 'recency_max': 30, 'label': 'Loyal Customers'},
-                2: {'recency_min': 90, 'label': 'At-Risk Customers'},
-                3: {'default': True, 'label': 'Potential Loyalists'}
-            }
-        }
-
-    def _assign_segment(self, row):
-        """Assign segment based on rules"""
-        if row['monetary'] > 1000 and row['frequency'] > 5:
-            return 0  # High-Value Champions
-        elif row['monetary'] > 500 and row['recency'] < 30:
-            return 1  # Loyal Customers
-        elif row['recency'] > 90:
-            return 2  # At-Risk Customers
-        else:
-            return 3  # Potential Loyalists
-
-    def _get_mock_centers(self):
-        """Get mock cluster centers"""
-        return [
-            [20, 8, 1500, 187.5],  # High-Value Champions
-            [15, 6, 750, 125.0],   # Loyal Customers
-            [120, 2, 200, 100.0],  # At-Risk Customers
-            [45, 4, 400, 100.0]    # Potential Loyalists
-        ]
-
-    def _count_customers_per_segment(self, rfm_features):
-        """Count customers per segment"""
-        segments = rfm_features.apply(self._assign_segment, axis=1)
-        counts = []
-        for i in range(self.n_clusters):
-            counts.append(int((segments == i).sum()))
-        return counts
+    def _get_cluster_centers(self):
+        """Get cluster centers in original feature units"""
+        mean = np.array([self.scaler_params['mean'][f] for f in self.feature_names])
+        std = np.array([self.scaler_params['std'][f] for f in self.feature_names])
+        std[std == 0] = 1.0
+        return (self.model.cluster_centers_ * std + mean).round(2).tolist()
 
     def _generate_mock_segments(self, customer_data):
         """Generate mock segmentation for demonstration"""
@@ -176,7 +263,7 @@ class CustomerSegmentation:
             segment_summary = self.create_segment_descriptions(rfm_features)
 
             return {
-                'customer_segments': rfm_features.to_dict('records'),
+                'customer_segments': self._records(rfm_features),
                 'segment_summary': segment_summary,
                 'note': 'Mock data - train model for real segmentation'
             }
@@ -0,0 +1,232 @@
+import numpy as np
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from app.utils.deadline import check_deadline
+
+logger = logging.getLogger(__name__)
+
+# Shared with worker processes through the pool initializer so the data
+# matrix is shipped once per worker instead of once per restart
+_worker_data = None
+
+
+def _init_worker(X):
+    global _worker_data
+    _worker_data = X
+
+
+def _run_in_worker(params, seed):
+    return _single_run(_worker_data, params, seed)
+
+
+def chunked_assign(X, centers, chunk_size=65536):
+    """Return nearest-center labels and squared distances, computed in row chunks"""
+    n_samples = X.shape[0]
+    labels = np.empty(n_samples, dtype=np.int32)
+    distances = np.empty(n_samples, dtype=np.float64)
+    center_norms = np.einsum('ij,ij->i', centers, centers)
+
+    for start in range(0, n_samples, chunk_size):
+        chunk = X[start:start + chunk_size]
+        # ||x - c||^2 = ||x||^2 - 2 x.c + ||c||^2, only a (chunk, k) block in memory
+        d2 = center_norms[np.newaxis, :] - 2.0 * chunk @ centers.T
+        d2 += np.einsum('ij,ij->i', chunk, chunk)[:, np.newaxis]
+        chunk_labels = d2.argmin(axis=1)
+        labels[start:start + chunk_size] = chunk_labels
+        distances[start:start + chunk_size] = np.maximum(d2[np.arange(len(chunk)), chunk_labels], 0.0)
+
+    return labels, distances
+
+
+def kmeans_plus_plus(X, n_clusters, rng, chunk_size=65536):
+    """Pick initial centers with the k-means++ seeding strategy"""
+    n_samples = X.shape[0]
+    centers = np.empty((n_clusters, X.shape[1]), dtype=np.float64)
+    centers[0] = X[rng.integers(n_samples)]
+    _, closest = chunked_assign(X, centers[:1], chunk_size)
+
+    for i in range(1, n_clusters):
+        total = closest.sum()
+        if total <= 0:
+            centers[i] = X[rng.integers(n_samples)]
+        else:
+            centers[i] = X[np.searchsorted(np.cumsum(closest), rng.random() * total)]
+        _, new_dist = chunked_assign(X, centers[i:i + 1], chunk_size)
+        np.minimum(closest, new_dist, out=closest)
+
+    return centers
+
+
+def _lloyd(X, centers, params):
+    """Full-batch Lloyd iterations"""
+    n_clusters = centers.shape[0]
+    n_iter = 0
+    for n_iter in range(1, params['max_iter'] + 1):
+        check_deadline()
+        labels, distances = chunked_assign(X, centers, params['chunk_size'])
+        counts = np.bincount(labels, minlength=n_clusters)
+        sums = np.column_stack([
+            np.bincount(labels, weights=X[:, j], minlength=n_clusters)
+            for j in range(X.shape[1])
+        ])
+
+        new_centers = centers.copy()
+        non_empty = counts > 0
+        new_centers[non_empty] = sums[non_empty] / counts[non_empty, np.newaxis]
+        # Re-seed empty clusters with the points furthest from their center
+        for empty, idx in zip(np.flatnonzero(~non_empty), np.argsort(distances)[::-1]):
+            new_centers[empty] = X[idx]
+
+        shift = np.sum((new_centers - centers) ** 2)
+        centers = new_centers
+        if shift <= params['tol']:
+            break
+
+    return centers, n_iter
+
+
+def _mini_batch(X, centers, params, rng):
+    """Mini-batch updates with per-center learning rates"""
+    n_samples = X.shape[0]
+    n_clusters = centers.shape[0]
+    batch_size = params['batch_size']
+    counts = np.zeros(n_clusters, dtype=np.float64)
+    ewa_inertia = None
+    no_improvement = 0
+    best_ewa = np.inf
+    n_iter = 0
+
+    for n_iter in range(1, params['max_iter'] + 1):
+        check_deadline()
+        batch = X[rng.integers(0, n_samples, batch_size)]
+        labels, distances = chunked_assign(batch, centers, params['chunk_size'])
+
+        batch_counts = np.bincount(labels, minlength=n_clusters)
+        batch_sums = np.column_stack([
+            np.bincount(labels, weights=batch[:, j], minlength=n_clusters)
+            for j in range(X.shape[1])
+        ])
+        touched = batch_counts > 0
+        counts[touched] += batch_counts[touched]
+        # Step size 1/count moves each center towards the running mean of its points
+        eta = batch_counts[touched] / counts[touched]
+        batch_means = batch_sums[touched] / batch_counts[touched, np.newaxis]
+        centers[touched] += eta[:, np.newaxis] * (batch_means - centers[touched])
+
+        batch_inertia = distances.sum() / batch_size
+        ewa_inertia = batch_inertia if ewa_inertia is None else 0.9 * ewa_inertia + 0.1 * batch_inertia
+        if ewa_inertia < best_ewa * (1 - params['tol']):
+            best_ewa = ewa_inertia
+            no_improvement = 0
+        else:
+            no_improvement += 1
+            if no_improvement >= params['max_no_improvement']:
+                break
+
+    return centers, n_iter
+
+
+def _single_run(X, params, seed):
+    rng = np.random.default_rng(seed)
+    init_size = params['init_size']
+    init_data = X if X.shape[0] <= init_size else X[rng.choice(X.shape[0], init_size, replace=False)]
+    centers = kmeans_plus_plus(init_data, params['n_clusters'], rng, params['chunk_size'])
+
+    if params['batch_size'] and X.shape[0] > params['batch_size']:
+        centers, n_iter = _mini_batch(X, centers, params, rng)
+    else:
+        centers, n_iter = _lloyd(X, centers, params)
+
+    _, distances = chunked_assign(X, centers, params['chunk_size'])
+    return centers, float(distances.sum()), n_iter
+
+
+class KMeans:
+    """NumPy k-means with k-means++ seeding, mini-batch updates and parallel restarts"""
+
+    def __init__(self, n_clusters=4, n_init=4, max_iter=300, tol=1e-4, batch_size=None,
+                 max_no_improvement=10, init_size=100000, chunk_size=65536, n_jobs=1,
+                 random_state=42):
+        self.n_clusters = n_clusters
+        self.n_init = n_init
+        self.max_iter = max_iter
+        self.tol = tol
+        self.batch_size = batch_size
+        self.max_no_improvement = max_no_improvement
+        self.init_size = init_size
+        self.chunk_size = chunk_size
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.cluster_centers_ = None
+        self.inertia_ = None
+        self.n_iter_ = None
+
+    def fit(self, X):
+        """Fit cluster centers, keeping the best of n_init restarts"""
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        if X.shape[0] < self.n_clusters:
+            raise ValueError(f"Need at least {self.n_clusters} samples, got {X.shape[0]}")
+
+        params = {
+            'n_clusters': self.n_clusters,
+            'max_iter': self.max_iter,
+            'tol': self.tol,
+            'batch_size': self.batch_size,
+            'max_no_improvement': self.max_no_improvement,
+            'init_size': self.init_size,
+            'chunk_size': self.chunk_size
+        }
+        seeds = np.random.SeedSequence(self.random_state).spawn(self.n_init)
+
+        if self.n_jobs and self.n_jobs > 1 and self.n_init > 1:
+            workers = min(self.n_jobs, self.n_init)
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(X,)) as pool:
+                runs = list(pool.map(_run_in_worker, [params] * self.n_init, seeds))
+        else:
+            runs = [_single_run(X, params, seed) for seed in seeds]
+
+        centers, inertia, n_iter = min(runs, key=lambda run: run[1])
+        self.cluster_centers_ = centers
+        self.inertia_ = inertia
+        self.n_iter_ = n_iter
+        logger.info(f"K-means converged: inertia={inertia:.2f}, iterations={n_iter}")
+        return self
+
+    def predict(self, X):
+        """Assign each row to its nearest cluster center"""
+        if self.cluster_centers_ is None:
+            raise ValueError("KMeans model is not fitted")
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        labels, _ = chunked_assign(X, self.cluster_centers_, self.chunk_size)
+        return labels
+
+
+def silhouette_score(X, labels, sample_size=2000, random_state=42):
+    """Mean silhouette coefficient, estimated on a random sample for large inputs"""
+    X = np.asarray(X, dtype=np.float64)
+    labels = np.asarray(labels)
+    if X.shape[0] > sample_size:
+        idx = np.random.default_rng(random_state).choice(X.shape[0], sample_size, replace=False)
+        X, labels = X[idx], labels[idx]
+
+    unique_labels = np.unique(labels)
+    if len(unique_labels) < 2:
+        return 0.0
+
+    sq_norms = np.einsum('ij,ij->i', X, X)
+    distances = np.sqrt(np.maximum(sq_norms[:, None] - 2.0 * X @ X.T + sq_norms[None, :], 0.0))
+
+    # Mean distance from every point to every cluster
+    one_hot = (labels[:, None] == unique_labels[None, :]).astype(np.float64)
+    sizes = one_hot.sum(axis=0)
+    cluster_dist = distances @ one_hot
+    own = np.searchsorted(unique_labels, labels)
+    own_sizes = sizes[own]
+
+    a = cluster_dist[np.arange(len(labels)), own] / np.maximum(own_sizes - 1, 1)
+    mean_dist = cluster_dist / sizes[None, :]
+    mean_dist[np.arange(len(labels)), own] = np.inf
+    b = mean_dist.min(axis=1)
+
+    s = np.where(own_sizes > 1, (b - a) / np.maximum(np.maximum(a, b), 1e-12), 0.0)
+    return float(s.mean())
@@ -2,14 +2,34 @@ import pandas as pd
 import numpy as np
 import logging
 from datetime import datetime, timedelta
+from app.utils.drift import DriftMonitor
+from app.utils.deadline import deadline_active
 
 logger = logging.getLogger(__name__)
 
+
+def forecast_path(mean, trend, std, first_weekday, periods, noise=0):
+    """Point forecast and interval for steps 1..periods (noise-free unless noise is given).
+
+    Parameters broadcast, so a column of fitted models (one per backtest cutoff)
+    yields one forecast row per model.
+    """
+    mean, trend, std, first_weekday = (np.asarray(v, dtype=np.float64)[..., np.newaxis]
+                                       for v in (mean, trend, std, first_weekday))
+    steps = np.arange(1, periods + 1)
+    day_of_week = (first_weekday + steps - 1) % 7
+    # Trend plus a weekly pattern, kept non-negative
+    yhat = np.maximum(0, mean + trend * steps + 0.1 * mean * np.sin(2 * np.pi * day_of_week / 7) + noise)
+    return yhat, yhat - std * 0.5, yhat + std * 0.5
+
+
 class SalesForecaster:
     def __init__(self):
         self.model = None
         self.is_fitted = False
         self.training_data = None
+        self.version = 0
+        self.drift_reference = None
 
     def prepare_data(self, df):
         """Prepare data for forecasting model"""
@@ -49,7 +69,10 @@ class SalesForecaster:
                 'max_value': df['y'].max()
             }
 
+            # Training-time histogram of daily sales that new days are compared against
+            self.drift_reference = DriftMonitor({'y': self.model['mean']}, {'y': self.model['std']}).update(df)
             self.is_fitted = True
+            self.version += 1
             logger.info("Sales forecasting model trained successfully (mock)")
             return self
 
@@ -70,24 +93,16 @@ class SalesForecaster:
             last_date = self.model['last_date']
 
             # Generate forecast based on trend and seasonality
-            forecast_data = []
-            for i in range(1, periods + 1):
-                forecast_date = last_date + timedelta(days=i)
-
-                # Add trend
-                value = base_sales + (trend * i)
-
-                # Add seasonal component (weekly pattern)
-                day_of_week = forecast_date.weekday()
-                seasonal = 0.1 * base_sales * np.sin(2 * np.pi * day_of_week / 7)
-
-                # Add some controlled noise
-                noise = np.random.normal(0, std * 0.05) if std > 0 else 0
-
-                forecast_value = max(0, value + seasonal + noise)  # Ensure non-negative
+            first_date = last_date + timedelta(days=1)
+            # Add some controlled noise
+            noise = np.random.normal(0, std * 0.05, periods) if std > 0 else 0
+            yhat, _, _ = forecast_path(base_sales, trend, std, first_date.weekday(), periods, noise)
 
+            forecast_data = []
+            for i, value in enumerate(yhat):
+                forecast_value = float(value)
                 forecast_data.append({
-                    'ds': forecast_date.strftime('%Y-%m-%d'),
+                    'ds': (first_date + timedelta(days=i)).strftime('%Y-%m-%d'),
                     'yhat': round(forecast_value, 2),
                     'yhat_lower': round(forecast_value - std * 0.5, 2),
                     'yhat_upper': round(forecast_value + std * 0.5, 2)
@@ -101,6 +116,8 @@ class SalesForecaster:
 
         except Exception as e:
             logger.error(f"Error generating forecast: {str(e)}")
+            if deadline_active():
+                raise
             return self._generate_mock_forecast(periods)
 
     def _generate_components(self, forecast_data):
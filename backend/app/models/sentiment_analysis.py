@@ -1,15 +1,24 @@
 import pandas as pd
 import numpy as np
-from collections import Counter
+from collections import Counter, OrderedDict
 import re
+import threading
 import logging
+from app.utils.deadline import deadline_active
 
 logger = logging.getLogger(__name__)
 
 class SentimentAnalyzer:
-    def __init__(self):
+    def __init__(self, cache_size=100000):
         self.model = None
         self.is_fitted = False
+        # Normalized text -> (label, probabilities), least recently used first
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.rows_scored = 0
         self.positive_words = ['good', 'great', 'excellent', 'amazing', 'love', 'perfect', 'best', 'awesome', 'fantastic']
         self.negative_words = ['bad', 'terrible', 'awful', 'hate', 'worst', 'horrible', 'disappointing', 'poor']
     
@@ -30,6 +39,7 @@ class SentimentAnalyzer:
             # Mock training - analyze word patterns
             self.model = self._create_word_based_model(reviews_data)
             self.is_fitted = True
+            self.clear_cache()
 
             logger.info("Sentiment analysis model trained successfully (mock)")
             return self
@@ -44,16 +54,8 @@ class SentimentAnalyzer:
             if not self.is_fitted:
                 return self._generate_mock_analysis(reviews_data)
 
-            reviews_data['clean_text'] = reviews_data['review_text'].apply(self.preprocess_text)
-
-            # Predict sentiments using word-based approach
-            predictions = []
-            probabilities = []
-
-            for text in reviews_data['clean_text']:
-                sentiment, prob = self._predict_sentiment(text)
-                predictions.append(sentiment)
-                probabilities.append(prob)
+            # Predict sentiments using word-based approach, once per distinct text
+            predictions, probabilities, clean_texts, codes = self._score(reviews_data['review_text'])
 
             # Calculate sentiment distribution
             sentiment_counts = Counter(predictions)
@@ -64,21 +66,74 @@ class SentimentAnalyzer:
             }
 
             # Extract top words for each sentiment
-            top_words = self._extract_top_words_simple(reviews_data, predictions)
+            top_words = self._extract_top_words_simple(clean_texts, codes, predictions)
 
             return {
                 'sentiment_distribution': sentiment_distribution,
-                'predictions': predictions,
-                'probabilities': probabilities,
+                'predictions': predictions.tolist(),
+                'probabilities': probabilities.tolist(),
                 'top_positive_words': top_words['positive'],
                 'top_negative_words': top_words['negative'],
+                'cache': self.cache_stats(),
                 'note': 'Mock sentiment analysis - install scikit-learn for advanced NLP'
             }
 
         except Exception as e:
             logger.error(f"Error analyzing sentiment: {str(e)}")
+            if deadline_active():
+                raise
             return self._generate_mock_analysis(reviews_data)
     
+    def predict_labels(self, texts):
+        """Sentiment label for each raw review text"""
+        return self._score(texts)[0]
+
+    def _score(self, texts):
+        """Score each distinct normalized text once and broadcast back to rows.
+
+        Returns per-row labels and probabilities, plus the distinct normalized
+        texts and each row's index into them.
+        """
+        text_codes, raw_uniques = pd.factorize(pd.Series(texts, dtype=object).fillna(''), use_na_sentinel=False)
+        # Different raw texts can normalize to the same string; score those once too
+        clean_codes, clean_texts = pd.factorize(np.array([self.preprocess_text(t) for t in raw_uniques], dtype=object))
+        codes = clean_codes[text_codes]
+
+        labels = np.empty(len(clean_texts), dtype=object)
+        probabilities = np.empty((len(clean_texts), 3), dtype=np.float64)
+        with self._cache_lock:
+            for i, text in enumerate(clean_texts):
+                result = self._cache.get(text)
+                if result is None:
+                    self.cache_misses += 1
+                    result = self._predict_sentiment(text)
+                    self._cache[text] = result
+                    if len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+                else:
+                    self.cache_hits += 1
+                    self._cache.move_to_end(text)
+                labels[i], probabilities[i] = result
+            self.rows_scored += len(codes)
+
+        return labels[codes], probabilities[codes], np.asarray(clean_texts, dtype=object), codes
+
+    def cache_stats(self):
+        """Result-cache occupancy, hit rate and rows scored per distinct text"""
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            'size': len(self._cache),
+            'capacity': self.cache_size,
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'hit_rate': round(self.cache_hits / lookups, 4) if lookups else 0.0,
+            'dedup_ratio': round(self.rows_scored / lookups, 2) if lookups else 0.0
+        }
+
+    def clear_cache(self):
+        with self._cache_lock:
+            self._cache.clear()
+
     def _create_word_based_model(self, reviews_data):
         """Create a simple word-based sentiment model"""
         return {
@@ -113,22 +168,23 @@ class SentimentAnalyzer:
 
         return sentiment, probs
 
-    def _extract_top_words_simple(self, reviews_data, predictions, top_n=10):
+    def _extract_top_words_simple(self, clean_texts, codes, predictions, top_n=10):
         """Extract top words for each sentiment using simple frequency"""
         top_words = {'positive': [], 'negative': []}
 
         for sentiment in ['positive', 'negative']:
-            sentiment_texts = reviews_data[np.array(predictions) == sentiment]['clean_text']
-            if len(sentiment_texts) > 0:
-                # Count word frequencies
+            selected = codes[predictions == sentiment]
+            if len(selected) > 0:
+                # Count word frequencies once per distinct text, weighted by how often it occurs
                 word_counts = Counter()
-                for text in sentiment_texts:
-                    words = text.split()
-                    word_counts.update(words)
+                multiplicity = np.bincount(selected, minlength=len(clean_texts))
+                for text_code in np.flatnonzero(multiplicity):
+                    for word in clean_texts[text_code].split():
+                        word_counts[word] += int(multiplicity[text_code])
 
                 # Get top words
                 top_words[sentiment] = [
-                    {'word': word, 'score': count / len(sentiment_texts)}
+                    {'word': word, 'score': count / len(selected)}
                     for word, count in word_counts.most_common(top_n)
                     if len(word) > 2  # Filter out short words
                 ]
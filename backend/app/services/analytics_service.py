@@ -1,85 +1,115 @@
 import asyncio
+import functools
 import pandas as pd
 import numpy as np
 from app.models.sales_forecasting import SalesForecaster
 from app.models.customer_segmentation import CustomerSegmentation
 from app.models.sentiment_analysis import SentimentAnalyzer
-from app.models.churn_prediction import ChurnPredictor
-from app.services.data_service import DataService
+from app.models.churn_prediction import ChurnPredictor, RISK_LEVELS
+from app.models.churn_calibration import threshold_sweep, reliability_bins, rule_grid_search
+from app.models.forecast_backtest import backtest_series
+from app.services.data_service import DataService, InsufficientDataError
+from app.services.sharded_analytics import ShardedAnalytics
+from app.services.scoring_service import ScoringTable
+from app.utils.sentiment_aggregates import SentimentAggregates
+from app.utils.deadline import check_deadline, to_thread
 import logging
+import os
+import threading
 
 logger = logging.getLogger(__name__)
 
+# Model attributes, in retraining order
+MODEL_NAMES = ['sales_forecaster', 'customer_segmentation', 'sentiment_analyzer', 'churn_predictor']
+# New days of sales needed before the forecaster's input can count as drifted
+FORECAST_DRIFT_MIN_DAYS = 7
+# Smallest data each model can be fitted on
+MIN_FORECAST_DAYS = 2
+MIN_CHURN_CUSTOMERS = 2
+
+# Dashboard panels and the shared per-customer intermediates each one consumes
+DASHBOARD_PANELS = {
+    'overview': [],
+    'forecast': [],
+    'segmentation': ['rfm_features'],
+    'sentiment': [],
+    'churn': ['churn_features']
+}
+
 class AnalyticsService:
-    def __init__(self):
-        self.data_service = DataService()
+    def __init__(self, data_service=None, sharded_analytics=None):
+        self.data_service = data_service or DataService()
         self.sales_forecaster = SalesForecaster()
         self.customer_segmentation = CustomerSegmentation()
         self.sentiment_analyzer = SentimentAnalyzer()
         self.churn_predictor = ChurnPredictor()
         self._models_trained = False
+        self.model_version = 0
+        # Tenants share one worker pool instead of each holding its own processes
+        self.sharded_analytics = sharded_analytics or ShardedAnalytics(n_shards=int(os.getenv('ANALYTICS_SHARDS', '0')) or None)
+        self._backtest_cache = {}
+        self._calibration_cache = {}
+        self._drift_cache = None
+        # drift_reference each data-service monitor was registered for; retraining replaces it
+        self._monitored_references = {}
+        self.scoring_table = None
+        self.sentiment_aggregates = SentimentAggregates()
+        self._sentiment_scored = 0
+        self._sentiment_lock = threading.Lock()
         
-    async def get_business_overview(self):
-        """Get high-level business metrics"""
+    async def get_business_overview(self, start=None, end=None, as_of=None):
+        """Get high-level business metrics, optionally for a date window or as of a past date"""
         try:
-            # Get sample data
-            sales_data = self.data_service.get_sales_data()
-            customer_data = self.data_service.get_customer_data()
-            
-            total_revenue = sales_data['total_amount'].sum()
-            active_customers = customer_data['customer_id'].nunique()
-            total_orders = len(sales_data)
-            
-            # Calculate satisfaction score (mock)
-            satisfaction_score = np.random.uniform(75, 95)
-            
-            return {
-                "total_revenue": float(total_revenue),
-                "active_customers": int(active_customers),
-                "total_orders": int(total_orders),
-                "satisfaction_score": round(satisfaction_score, 1)
-            }
+            if start is not None or end is not None or as_of is not None:
+                return await to_thread(self._build_window_overview, start, end, as_of)
+            return await to_thread(self._build_overview, self.data_service.snapshot())
         except Exception as e:
             logger.error(f"Error getting business overview: {e}")
             raise
     
-    async def generate_sales_forecast(self, periods=30):
-        """Generate sales forecast"""
+    async def get_active_customers(self, start=None, end=None, categories=None, locations=None,
+                                   group_by=None, exact=False):
+        """Count distinct active customers for a date window and category/location filters"""
         try:
-            sales_data = self.data_service.get_sales_data()
-            
-            # Prepare data for forecasting
-            daily_sales = sales_data.groupby('order_date')['total_amount'].sum().reset_index()
-            
-            if not self.sales_forecaster.is_fitted:
-                self.sales_forecaster.train(daily_sales)
-            
-            forecast_result = self.sales_forecaster.forecast(periods)
-            
+            if start is not None and end is not None and start > end:
+                raise ValueError("start must not be after end")
+            counts = await to_thread(self.data_service.active_customers, start, end, categories, locations, group_by, exact)
             return {
-                "forecast": forecast_result['forecast'],
-                "components": forecast_result['components'],
-                "insights": self._generate_forecast_insights(forecast_result)
+                "active_customers": counts if group_by is None else None,
+                "breakdown": counts if group_by is not None else None,
+                "exact": exact,
+                "relative_error": 0.0 if exact else round(self.data_service.distinct_count_error, 4),
+                "filters": {"start": start, "end": end, "categories": categories, "locations": locations}
             }
+        except Exception as e:
+            logger.error(f"Error counting active customers: {e}")
+            raise
+
+    async def generate_sales_forecast(self, periods=30):
+        """Generate sales forecast"""
+        try:
+            return await to_thread(self._build_forecast, self.data_service.snapshot(), periods)
         except Exception as e:
             logger.error(f"Error generating sales forecast: {e}")
             raise
     
+    async def get_forecast_backtest(self, horizon=30, min_train=30, step=1, by_category=False):
+        """Rolling-origin backtest of the sales forecaster, cached per forecaster version"""
+        try:
+            if horizon < 1 or step < 1:
+                raise ValueError("horizon and step must be positive")
+            return await to_thread(self._build_backtest, horizon, min_train, step, by_category)
+        except Exception as e:
+            logger.error(f"Error backtesting sales forecast: {e}")
+            raise
+
     async def analyze_customer_segments(self):
         """Analyze customer segments"""
         try:
-            customer_data = self.data_service.get_customer_data()
-            
-            if not self.customer_segmentation.is_fitted:
-                training_result = self.customer_segmentation.train(customer_data)
-            
-            segmentation_result = self.customer_segmentation.predict_segments(customer_data)
-            
-            return {
-                "segments": segmentation_result['segment_summary'],
-                "customer_data": segmentation_result['customer_segments'][:100],  # Limit for performance
-                "insights": self._generate_segmentation_insights(segmentation_result)
-            }
+            table = self.scoring_table
+            if table is not None:
+                return self._segmentation_from_table(table)
+            return await to_thread(self._build_segmentation, self.data_service.snapshot())
         except Exception as e:
             logger.error(f"Error analyzing customer segments: {e}")
             raise
@@ -87,53 +117,499 @@ class AnalyticsService:
     async def analyze_sentiment(self):
         """Analyze product review sentiment"""
         try:
-            reviews_data = self.data_service.get_reviews_data()
-            
-            if not self.sentiment_analyzer.is_fitted:
-                self.sentiment_analyzer.train(reviews_data)
-            
-            sentiment_result = self.sentiment_analyzer.analyze_sentiment(reviews_data)
-            
-            return {
-                "sentiment_distribution": sentiment_result['sentiment_distribution'],
-                "top_positive_words": sentiment_result['top_positive_words'],
-                "top_negative_words": sentiment_result['top_negative_words'],
-                "insights": self._generate_sentiment_insights(sentiment_result)
-            }
+            return await to_thread(self._build_sentiment, self.data_service.snapshot())
         except Exception as e:
             logger.error(f"Error analyzing sentiment: {e}")
             raise
     
+    async def get_worst_products(self, n=10, min_reviews=5, start=None, end=None):
+        """Products with the highest share of negative reviews"""
+        try:
+            products = await to_thread(
+                self._query_sentiment_aggregates, SentimentAggregates.worst_products, n, min_reviews, start, end
+            )
+            ids = self.data_service.decode_ids('product_id', [p['product_code'] for p in products])
+            return {
+                "products": [
+                    {'product_id': product_id, **{k: v for k, v in p.items() if k != 'product_code'}}
+                    for product_id, p in zip(ids, products)
+                ]
+            }
+        except Exception as e:
+            logger.error(f"Error ranking products by sentiment: {e}")
+            raise
+
+    async def get_sentiment_trend(self, product_id=None, start=None, end=None):
+        """Weekly sentiment counts for one product or across all products"""
+        try:
+            product_code = None
+            if product_id is not None:
+                product_code = self.data_service.keys['product_id'].lookup(product_id)
+                if product_code < 0:
+                    raise KeyError(product_id)
+            weeks = await to_thread(self._query_sentiment_aggregates, SentimentAggregates.trend, product_code, start, end)
+            return {
+                "product_id": product_id,
+                "weeks": weeks
+            }
+        except KeyError:
+            raise
+        except Exception as e:
+            logger.error(f"Error building sentiment trend: {e}")
+            raise
+
+    def _query_sentiment_aggregates(self, query, *args):
+        """Score reviews appended since the last update into the product x week aggregates, then run query on them.
+
+        Both happen under the sentiment lock: a query compacts the buffered
+        batches, so it must not run while another thread adds to them.
+        """
+        with self._sentiment_lock:
+            reviews, total = self.data_service.get_reviews_since(self._sentiment_scored)
+            if len(reviews):
+                if not self.sentiment_analyzer.is_fitted:
+                    self.sentiment_analyzer.train(self.data_service.get_reviews_data())
+                check_deadline()
+                self.sentiment_aggregates.add(
+                    reviews['product_id'].to_numpy(),
+                    reviews['review_date'].to_numpy(),
+                    self.sentiment_analyzer.predict_labels(reviews['review_text']),
+                    reviews['rating'].to_numpy()
+                )
+                self._sentiment_scored = total
+            return query(self.sentiment_aggregates, *args)
+
     async def predict_churn(self):
         """Predict customer churn"""
         try:
-            customer_data = self.data_service.get_customer_data()
-            
+            table = self.scoring_table
+            if table is not None:
+                return self._churn_from_table(table)
+            return await to_thread(self._build_churn, self.data_service.snapshot())
+        except Exception as e:
+            logger.error(f"Error predicting churn: {e}")
+            raise
+
+    async def get_churn_calibration(self, n_bins=10, max_points=50, top=10):
+        """Threshold sweep, reliability curve and rule grid search against observed churn"""
+        try:
+            if n_bins < 1 or max_points < 2 or top < 1:
+                raise ValueError("bins must be positive, points at least 2 and top positive")
+            return await to_thread(self._build_calibration, n_bins, max_points, top)
+        except Exception as e:
+            logger.error(f"Error calibrating churn model: {e}")
+            raise
+
+    async def set_churn_risk_thresholds(self, medium, high):
+        """Move the Medium/High risk cut-offs; scored tables and cached payloads are invalidated"""
+        self.churn_predictor.set_risk_thresholds(medium, high)
+        self.model_version += 1
+        return {'risk_thresholds': list(self.churn_predictor.risk_thresholds), 'model_version': self.model_version}
+
+    async def stream_dashboard(self, panels=None, periods=30):
+        """Compute dashboard panels from one data snapshot, yielding each as soon as it is ready"""
+        panels = panels or list(DASHBOARD_PANELS)
+        unknown = [panel for panel in panels if panel not in DASHBOARD_PANELS]
+        if unknown:
+            raise ValueError(f"Unknown dashboard panels: {', '.join(unknown)}")
+
+        snapshot = self.data_service.snapshot()
+        intermediate_builders = {
+            'churn_features': lambda: self.churn_predictor.prepare_features(snapshot['customers']),
+            'rfm_features': lambda: self.customer_segmentation.create_rfm_features(snapshot['customers'])
+        }
+        panel_builders = {
+            'overview': lambda shared: self._build_overview(snapshot),
+            'forecast': lambda shared: self._build_forecast(snapshot, periods),
+            'segmentation': lambda shared: self._build_segmentation(snapshot, shared['rfm_features']),
+            'sentiment': lambda shared: self._build_sentiment(snapshot),
+            'churn': lambda shared: self._build_churn(snapshot, shared['churn_features'])
+        }
+
+        # Each shared intermediate is built once, however many panels need it
+        intermediates = {}
+        for panel in panels:
+            for name in DASHBOARD_PANELS[panel]:
+                if name not in intermediates:
+                    intermediates[name] = asyncio.ensure_future(to_thread(intermediate_builders[name]))
+
+        async def run_panel(panel):
+            try:
+                shared = {name: await intermediates[name] for name in DASHBOARD_PANELS[panel]}
+                return {'panel': panel, 'data': await to_thread(panel_builders[panel], shared)}
+            except Exception as e:
+                logger.error(f"Error building dashboard panel '{panel}': {e}")
+                return {'panel': panel, 'error': str(e)}
+
+        tasks = [asyncio.ensure_future(run_panel(panel)) for panel in panels]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks + list(intermediates.values()):
+                task.cancel()
+
+    def _build_overview(self, snapshot):
+        sales_data = snapshot['sales']
+
+        total_revenue = sales_data['total_amount'].to_numpy().sum(dtype=np.float64)
+        # Distinct ordering customers from the same sketches as windowed overviews and active-customer queries
+        active_customers = self.data_service.window_totals()['active_customers']
+        total_orders = len(sales_data)
+        
+        # Calculate satisfaction score (mock)
+        satisfaction_score = np.random.uniform(75, 95)
+        
+        return {
+            "total_revenue": round(float(total_revenue), 2),
+            "active_customers": int(active_customers),
+            "total_orders": int(total_orders),
+            "satisfaction_score": round(satisfaction_score, 1)
+        }
+
+    def _build_window_overview(self, start, end, as_of):
+        # as_of caps the window end; without a start the window runs from the first order
+        if as_of is not None:
+            end = min(end, as_of) if end is not None else as_of
+        if start is not None and end is not None and start > end:
+            raise ValueError("start must not be after end")
+        totals = self.data_service.window_totals(start, end)
+
+        return {
+            "total_revenue": round(totals['revenue'], 2),
+            "active_customers": totals['active_customers'],
+            "total_orders": totals['orders'],
+            "satisfaction_score": round(np.random.uniform(75, 95), 1),
+            "window": {"start": totals['start'], "end": totals['end']}
+        }
+
+    def _build_forecast(self, snapshot, periods):
+        self._require_data('sales_forecaster')
+        # Daily totals are maintained incrementally by the data service
+        if not self.sales_forecaster.is_fitted:
+            self.sales_forecaster.train(snapshot['daily_sales'])
+        check_deadline()
+        
+        forecast_result = self.sales_forecaster.forecast(periods)
+        try:
+            accuracy = self._build_backtest(periods, 30, 1, False)['series']['total']
+        except ValueError:
+            # Too little history to backtest this horizon
+            accuracy = None
+        
+        return {
+            "forecast": forecast_result['forecast'],
+            "components": forecast_result['components'],
+            "insights": self._generate_forecast_insights(forecast_result, accuracy)
+        }
+
+    def _build_backtest(self, horizon, min_train, step, by_category):
+        self._require_data('sales_forecaster')
+        if not self.sales_forecaster.is_fitted:
+            self.sales_forecaster.train(self.data_service.get_daily_sales())
+
+        version = self.sales_forecaster.version
+        key = (version, horizon, min_train, step, by_category)
+        if key not in self._backtest_cache:
+            # Backtest the series the current model was fitted on, plus per-category series on request
+            series = {'total': self.sales_forecaster.training_data}
+            if by_category:
+                series.update(self.data_service.get_daily_sales_by('product_category'))
+            results = backtest_series(series, horizon, min_train, step,
+                                      n_jobs=os.cpu_count() if by_category else 1)
+            if 'error' in results['total']:
+                raise ValueError(results['total']['error'])
+
+            self._backtest_cache = {k: v for k, v in self._backtest_cache.items() if k[0] == version}
+            self._backtest_cache[key] = {
+                'model_version': version,
+                'horizon': horizon,
+                'min_train': min_train,
+                'step': step,
+                'series': results
+            }
+        return self._backtest_cache[key]
+
+    def _build_calibration(self, n_bins, max_points, top):
+        self._require_data('churn_predictor')
+        snapshot = self.data_service.snapshot()
+        customer_data = snapshot['customers']
+        version = f"{snapshot['data_version']}.{self.model_version}"
+        key = (version, n_bins, max_points, top)
+        if key not in self._calibration_cache:
+            features = self.churn_predictor.prepare_features(customer_data)
+            if not self.churn_predictor.is_fitted:
+                self.churn_predictor.train(customer_data, features)
+
+            # Reuse the published scores when they were computed from this same snapshot and model
+            table = self.scoring_table
+            if table is not None and table.version == version:
+                probabilities = table.columns['churn_probability']
+            else:
+                probabilities = self.churn_predictor.predict_proba(features)
+            observed = customer_data['is_churned'].to_numpy(dtype=bool)
+            check_deadline()
+
+            sweep = threshold_sweep(observed, probabilities, max_points)
+            risk_codes = self.churn_predictor.risk_level_codes(probabilities)
+            counts = np.bincount(risk_codes, minlength=len(RISK_LEVELS))
+            churned = np.bincount(risk_codes, weights=observed, minlength=len(RISK_LEVELS))
+            self._calibration_cache = {k: v for k, v in self._calibration_cache.items() if k[0] == version}
+            self._calibration_cache[key] = {
+                'version': version,
+                'customers': int(len(observed)),
+                'observed_churn_rate': sweep['base_rate'],
+                'risk_thresholds': list(self.churn_predictor.risk_thresholds),
+                'risk_levels': [
+                    {
+                        'risk_level': level,
+                        'customers': int(counts[i]),
+                        'observed_churn_rate': round(float(churned[i] / counts[i]), 4) if counts[i] else None
+                    }
+                    for i, level in enumerate(RISK_LEVELS)
+                ],
+                'best_f1_threshold': sweep['best_f1_threshold'],
+                'best_f1': round(sweep['best_f1'], 4),
+                'threshold_curve': sweep['curve'],
+                'reliability': reliability_bins(observed, probabilities, n_bins),
+                'rule_baseline': rule_grid_search(customer_data, observed, top=top)
+            }
+        return self._calibration_cache[key]
+
+    def _build_segmentation(self, snapshot, rfm_features=None):
+        self._require_data('customer_segmentation')
+        customer_data = snapshot['customers']
+        if rfm_features is None:
+            rfm_features = self.customer_segmentation.create_rfm_features(customer_data)
+
+        if not self.customer_segmentation.is_fitted:
+            self.customer_segmentation.train(customer_data, rfm_features)
+        check_deadline()
+        
+        segmentation_result = self.customer_segmentation.predict_segments(customer_data, rfm_features)
+        
+        return {
+            "segments": segmentation_result['segment_summary'],
+            "customer_data": self._decode_customer_ids(segmentation_result['customer_segments'][:100]),  # Limit for performance
+            "insights": self._generate_segmentation_insights(segmentation_result)
+        }
+
+    def _build_sentiment(self, snapshot):
+        reviews_data = snapshot['reviews']
+
+        if not self.sentiment_analyzer.is_fitted:
+            self.sentiment_analyzer.train(reviews_data)
+        check_deadline()
+        
+        sentiment_result = self.sentiment_analyzer.analyze_sentiment(reviews_data)
+        
+        return {
+            "sentiment_distribution": sentiment_result['sentiment_distribution'],
+            "top_positive_words": sentiment_result['top_positive_words'],
+            "top_negative_words": sentiment_result['top_negative_words'],
+            "scoring_cache": sentiment_result.get('cache'),
+            "insights": self._generate_sentiment_insights(sentiment_result)
+        }
+
+    def _build_churn(self, snapshot, churn_features=None):
+        self._require_data('churn_predictor')
+        customer_data = snapshot['customers']
+        if churn_features is None:
+            churn_features = self.churn_predictor.prepare_features(customer_data)
+
+        if not self.churn_predictor.is_fitted:
+            self.churn_predictor.train(customer_data, churn_features)
+        check_deadline()
+        
+        churn_result = self.churn_predictor.predict_churn(customer_data, churn_features)
+        
+        return {
+            "churn_predictions": self._decode_customer_ids(churn_result['predictions'][:50]),  # Top 50 at-risk
+            "feature_importance": churn_result['feature_importance'],
+            "churn_rate": churn_result['overall_churn_rate'],
+            "insights": self._generate_churn_insights(churn_result)
+        }
+    
+    def score_customers(self, customer_ids):
+        """Churn risk and segment for specific customers, scored in one vectorized call"""
+        customers, missing = self.data_service.get_customers(customer_ids)
+        if len(customers) == 0:
+            return {'customers': [], 'missing': missing}
+
+        if not self.churn_predictor.is_fitted or not self.customer_segmentation.is_fitted:
+            self._require_data('churn_predictor', 'customer_segmentation')
+            customer_data = self.data_service.snapshot()['customers']
             if not self.churn_predictor.is_fitted:
                 self.churn_predictor.train(customer_data)
-            
-            churn_result = self.churn_predictor.predict_churn(customer_data)
-            
+            if not self.customer_segmentation.is_fitted:
+                self.customer_segmentation.train(customer_data)
+
+        probabilities = self.churn_predictor.predict_proba(self.churn_predictor.prepare_features(customers))
+        # Quintile scores rank against the whole population, so only the raw RFM values are needed here
+        rfm = self.customer_segmentation.create_rfm_features(customers, scores=False)
+        clusters = self.customer_segmentation.assign_clusters(rfm)
+
+        table = self.scoring_table
+        labels = {s['cluster_id']: s['description'] for s in table.segment_summary} if table is not None else {}
+        columns = {
+            'customer_id': self.data_service.decode_ids('customer_id', customers['customer_id'].to_numpy()).tolist(),
+            'age': customers['age'].to_numpy().tolist(),
+            # Placeholder customers first seen in orders have no demographics yet
+            'gender': [None if pd.isna(g) else g for g in customers['gender']],
+            'location': [None if pd.isna(l) else l for l in customers['location']],
+            'recency': [None if np.isnan(r) else r for r in rfm['recency'].to_numpy().tolist()],
+            'frequency': rfm['frequency'].to_numpy().tolist(),
+            'monetary': rfm['monetary'].to_numpy().round(2).tolist(),
+            'churn_probability': probabilities.tolist(),
+            'risk_level': [RISK_LEVELS[level] for level in self.churn_predictor.risk_level_codes(probabilities)],
+            'cluster': clusters.tolist(),
+            'segment': [labels.get(int(cluster)) for cluster in clusters]
+        }
+        scored = [dict(zip(columns, row)) for row in zip(*columns.values())]
+        return {'customers': scored, 'missing': missing}
+
+    def scoring_version(self):
+        """Data/model version behind the churn and segmentation payloads"""
+        table = self.scoring_table
+        if table is not None:
+            return table.version
+        return f"{self.data_service.data_version}.{self.model_version}"
+
+    def refresh_scoring_table(self):
+        """Score every customer from one snapshot and publish the result as the new scoring table"""
+        self._require_data('churn_predictor', 'customer_segmentation')
+        snapshot = self.data_service.snapshot()
+        version = f"{snapshot['data_version']}.{self.model_version}"
+        customer_data = snapshot['customers']
+        churn_features = self.churn_predictor.prepare_features(customer_data)
+        rfm_features = self.customer_segmentation.create_rfm_features(customer_data)
+
+        if not self.churn_predictor.is_fitted:
+            self.churn_predictor.train(customer_data, churn_features)
+        if not self.customer_segmentation.is_fitted:
+            self.customer_segmentation.train(customer_data, rfm_features)
+
+        # Readers keep whichever table they already picked up; the swap is a single assignment
+        self.scoring_table = ScoringTable.build(
+            customer_data, churn_features, rfm_features,
+            self.churn_predictor, self.customer_segmentation, version
+        )
+        return self.scoring_table
+
+    def _segmentation_from_table(self, table):
+        return {
+            "segments": table.segment_summary,
+            "customer_data": self._decode_customer_ids(table.head(100)),
+            "insights": self._generate_segmentation_insights({'segment_summary': table.segment_summary})
+        }
+
+    def _churn_from_table(self, table):
+        return {
+            "churn_predictions": self._decode_customer_ids(table.top_churn(50)),
+            "feature_importance": table.feature_importance,
+            "churn_rate": table.churn_rate,
+            "insights": self._generate_churn_insights({'overall_churn_rate': table.churn_rate})
+        }
+
+    async def get_sharded_summary(self):
+        """Churn and segmentation summary computed over customer shards in a process pool"""
+        try:
+            self._require_data('churn_predictor', 'customer_segmentation')
+            # Shallow snapshot: the tables are only copied shard by shard, inside the worker thread
+            snapshot = self.data_service.snapshot()
+            customer_data, sales_data = snapshot['customers'], snapshot['sales']
+
+            if not self.churn_predictor.is_fitted:
+                await to_thread(self.churn_predictor.train, customer_data)
+            if not self.customer_segmentation.is_fitted:
+                await to_thread(self.customer_segmentation.train, customer_data)
+
+            summary = await to_thread(
+                self.sharded_analytics.run,
+                customer_data, sales_data, self.churn_predictor, self.customer_segmentation
+            )
+
+            segments = []
+            for cluster, (count, means) in enumerate(zip(summary.segment_counts, summary.segment_means())):
+                cluster_means = pd.DataFrame([means], columns=['recency', 'frequency', 'monetary'])
+                segments.append({
+                    'cluster_id': cluster,
+                    'size': int(count),
+                    'avg_recency': float(means[0]),
+                    'avg_frequency': float(means[1]),
+                    'avg_monetary': round(float(means[2]), 2),
+                    'description': self.customer_segmentation.get_segment_label(cluster_means)
+                })
+
+            top_ids = self.data_service.decode_ids('customer_id', summary.top_customers)
             return {
-                "churn_predictions": churn_result['predictions'][:50],  # Top 50 at-risk
-                "feature_importance": churn_result['feature_importance'],
-                "churn_rate": churn_result['overall_churn_rate'],
-                "insights": self._generate_churn_insights(churn_result)
+                "segments": segments,
+                "churn_rate": summary.churn_rate,
+                "risk_distribution": dict(zip(RISK_LEVELS, summary.risk_counts.tolist())),
+                "top_at_risk": [
+                    {'customer_id': customer_id, 'churn_probability': float(prob)}
+                    for customer_id, prob in zip(top_ids, summary.top_probabilities)
+                ],
+                "rfm_quintile_boundaries": {
+                    feature: np.round(cuts, 2).tolist() for feature, cuts in summary.rfm_quantiles.boundaries().items()
+                },
+                "n_customers": summary.n_customers,
+                "n_shards": self.sharded_analytics.n_shards
             }
         except Exception as e:
-            logger.error(f"Error predicting churn: {e}")
+            logger.error(f"Error computing sharded summary: {e}")
             raise
+
+    def missing_data(self, name):
+        """Why a model cannot be fitted on the stored data yet, or None when it can"""
+        if name == 'sales_forecaster':
+            days = len(self.data_service.get_daily_sales())
+            if days < MIN_FORECAST_DAYS:
+                return f"sales forecasting needs orders on at least {MIN_FORECAST_DAYS} days (have {days})"
+        elif name in ('customer_segmentation', 'churn_predictor'):
+            customers = self.data_service.row_counts()['customers']
+            needed = self.customer_segmentation.n_clusters if name == 'customer_segmentation' else MIN_CHURN_CUSTOMERS
+            if customers < needed:
+                task = 'segmentation' if name == 'customer_segmentation' else 'churn prediction'
+                return f"{task} needs at least {needed} customers (have {customers})"
+        return None
+
+    def _require_data(self, *names):
+        """Raise InsufficientDataError unless every named model is fitted or can be fitted now"""
+        for name in names:
+            if not getattr(self, name).is_fitted:
+                reason = self.missing_data(name)
+                if reason is not None:
+                    raise InsufficientDataError(f"Not enough data yet: {reason}; ingest more records first")
+
+    def _decode_customer_ids(self, records):
+        """Swap integer customer codes for their string IDs in outgoing records"""
+        if not records or not isinstance(records[0].get('customer_id'), (int, np.integer)):
+            return records
+        ids = self.data_service.decode_ids('customer_id', [r['customer_id'] for r in records])
+        return [{**record, 'customer_id': customer_id} for record, customer_id in zip(records, ids)]
     
-    def _generate_forecast_insights(self, forecast_result):
-        """Generate insights from forecast results"""
+    def _generate_forecast_insights(self, forecast_result, accuracy=None):
+        """Generate insights from forecast results and their backtested accuracy"""
         forecast_data = forecast_result['forecast']
         avg_forecast = np.mean([f['yhat'] for f in forecast_data])
+        insights = [f"Predicted average daily sales: ${avg_forecast:,.2f}"]
         
-        return [
-            f"Predicted average daily sales: ${avg_forecast:,.2f}",
-            "Sales trend shows seasonal patterns",
-            "Consider inventory planning for peak periods"
-        ]
+        if accuracy is None:
+            insights.append("Not enough sales history yet to measure forecast accuracy")
+            return insights + ["Consider inventory planning for peak periods"]
+        
+        insights.append(
+            f"Backtested over {accuracy['folds']} cutoffs, daily forecasts are off by "
+            f"{accuracy['mape']:.1f}% on average (RMSE ${accuracy['rmse']:,.2f})"
+        )
+        coverage = accuracy['coverage'] * 100
+        if coverage < 70:
+            insights.append(f"Only {coverage:.0f}% of actual days fell inside the forecast range; "
+                            "plan inventory with extra buffer")
+        else:
+            insights.append(f"{coverage:.0f}% of actual days fell inside the forecast range")
+        return insights
     
     def _generate_segmentation_insights(self, segmentation_result):
         """Generate insights from segmentation results"""
@@ -167,26 +643,135 @@ class AnalyticsService:
             "Focus on improving key satisfaction drivers"
         ]
     
-    async def retrain_all_models(self):
-        """Retrain all ML models with latest data"""
+    async def get_model_drift(self):
+        """Compare each model's current input features with the data it was trained on"""
         try:
-            logger.info("Starting model retraining...")
-            
-            # Get fresh data
-            sales_data = self.data_service.get_sales_data()
-            customer_data = self.data_service.get_customer_data()
-            reviews_data = self.data_service.get_reviews_data()
-            
-            # Retrain models
-            daily_sales = sales_data.groupby('order_date')['total_amount'].sum().reset_index()
-            self.sales_forecaster.train(daily_sales)
-            self.customer_segmentation.train(customer_data)
-            self.sentiment_analyzer.train(reviews_data)
-            self.churn_predictor.train(customer_data)
-            
-            self._models_trained = True
+            return await to_thread(self._build_drift_report)
+        except Exception as e:
+            logger.error(f"Error checking model drift: {e}")
+            raise
+
+    async def models_to_retrain(self, force=False):
+        """Models whose inputs drifted (or that were never trained), or every model when forced"""
+        if force:
+            names = list(MODEL_NAMES)
+        else:
+            report = await self.get_model_drift()
+            names = [name for name in MODEL_NAMES if report['models'][name]['needs_retraining']]
+        # Models the stored data cannot fit yet are left until more has been ingested
+        return [name for name in names if self.missing_data(name) is None]
+
+    def _build_drift_report(self):
+        data_version = self.data_service.data_version
+        references = tuple(model.drift_reference for model in
+                           (self.sales_forecaster, self.customer_segmentation, self.churn_predictor))
+        key = (data_version, references)
+        if self._drift_cache is not None and self._drift_cache[0] == key:
+            return self._drift_cache[1]
+
+        models = {}
+        forecaster = self.sales_forecaster
+        if forecaster.is_fitted:
+            # Only days after the training window are new input to the forecaster
+            live = self._live_monitor('sales_forecaster')
+            models['sales_forecaster'] = live.compare(forecaster.drift_reference, min_observations=FORECAST_DRIFT_MIN_DAYS)
+        for name in ('customer_segmentation', 'churn_predictor'):
+            model = getattr(self, name)
+            if model.is_fitted:
+                models[name] = self._live_monitor(name).compare(model.drift_reference)
+
+        for name in MODEL_NAMES:
+            fitted = getattr(self, name).is_fitted
+            entry = models.setdefault(name, {'drifted': False})
+            # The sentiment lexicon keeps no feature statistics, so it is only retrained when forced
+            entry['monitored'] = name != 'sentiment_analyzer'
+            entry['fitted'] = fitted
+            entry['needs_retraining'] = not fitted or entry['drifted']
+
+        report = {'data_version': data_version, 'models': models}
+        self._drift_cache = (key, report)
+        return report
+
+    def _live_monitor(self, name):
+        """Current state of a model's live monitor, registering it with the data service after each training.
+
+        Registration fills the monitor from the stored data once; from then on the
+        data service folds every appended batch into it.
+        """
+        model = getattr(self, name)
+        reference = model.drift_reference
+        if self._monitored_references.get(name) is not reference:
+            check_deadline()
+            if name == 'sales_forecaster':
+                first_day = model.model['last_date'] + pd.Timedelta(days=1)
+                self.data_service.monitor_daily_sales(name, reference.spawn(), first_day)
+            elif name == 'customer_segmentation':
+                self.data_service.monitor_customers(
+                    name, reference.spawn(), functools.partial(model.create_rfm_features, scores=False))
+            else:
+                self.data_service.monitor_customers(name, reference.spawn(), model.prepare_features)
+            self._monitored_references[name] = reference
+        return self.data_service.monitor_state(name)
+
+    async def retrain_models(self, models):
+        """Retrain the named models with the latest data.
+
+        Fresh instances are fitted in a worker thread and swapped in afterwards, so
+        requests keep using the old, consistent models until training is done.
+        """
+        try:
+            logger.info(f"Retraining models: {', '.join(models)}")
+            trained = await to_thread(self._train_fresh_models, models)
+
+            if 'churn_predictor' in trained:
+                # Cut-offs moved while training was running carry over
+                trained['churn_predictor'].set_risk_thresholds(*self.churn_predictor.risk_thresholds)
+            for name, model in trained.items():
+                if name != 'sentiment_analyzer':
+                    setattr(self, name, model)
+            if 'sentiment_analyzer' in trained:
+                await to_thread(self._swap_sentiment_analyzer, trained['sentiment_analyzer'])
+
+            self._models_trained = all(getattr(self, name).is_fitted for name in MODEL_NAMES)
+            self.model_version += 1
             logger.info("Model retraining completed successfully")
-            
+
         except Exception as e:
             logger.error(f"Error during model retraining: {e}")
-            raise
\ No newline at end of file
+            raise
+
+    def _train_fresh_models(self, models):
+        """Fit untrained copies of the named models, with the current instances' settings, on one snapshot"""
+        snapshot = self.data_service.snapshot()
+        trained = {}
+        if 'sales_forecaster' in models:
+            forecaster = SalesForecaster()
+            # Versions keep counting up, so caches keyed on them never see a reused number
+            forecaster.version = self.sales_forecaster.version
+            forecaster.train(snapshot['daily_sales'])
+            trained['sales_forecaster'] = forecaster
+        if 'customer_segmentation' in models:
+            current = self.customer_segmentation
+            segmentation = CustomerSegmentation(current.n_clusters, current.n_init, current.batch_size, current.n_jobs)
+            segmentation.train(snapshot['customers'])
+            trained['customer_segmentation'] = segmentation
+        if 'churn_predictor' in models:
+            churn_predictor = ChurnPredictor(self.churn_predictor.risk_thresholds)
+            churn_predictor.train(snapshot['customers'])
+            trained['churn_predictor'] = churn_predictor
+        if 'sentiment_analyzer' in models:
+            analyzer = SentimentAnalyzer(self.sentiment_analyzer.cache_size)
+            analyzer.train(snapshot['reviews'])
+            trained['sentiment_analyzer'] = analyzer
+        return trained
+
+    def _swap_sentiment_analyzer(self, analyzer):
+        with self._sentiment_lock:
+            self.sentiment_analyzer = analyzer
+            # Rescore every review with the retrained analyzer on the next query
+            self.sentiment_aggregates = SentimentAggregates()
+            self._sentiment_scored = 0
+
+    async def retrain_all_models(self):
+        """Retrain all ML models with latest data"""
+        await self.retrain_models(await self.models_to_retrain(force=True))
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import logging
+from fastapi.encoders import jsonable_encoder
+
+logger = logging.getLogger(__name__)
+
+PUSH_PANELS = ['overview', 'churn', 'sentiment', 'forecast']
+
+
+def format_sse(event, data, event_id=None):
+    """Encode one server-sent event frame"""
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(jsonable_encoder(data))}")
+    return "\n".join(lines) + "\n\n"
+
+
+class DashboardPublisher:
+    """Recomputes dashboard panels once per data or model version change and fans the diff out to every subscriber"""
+
+    def __init__(self, analytics_service, poll_interval=1.0, queue_size=16, panels=None):
+        self.analytics_service = analytics_service
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.panels = panels or PUSH_PANELS
+        self._subscribers = set()
+        self._state = {}
+        self._version = None
+        self._snapshot_frame = None
+        self._task = None
+        self._ready = asyncio.Event()
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def current_version(self):
+        return f"{self.analytics_service.data_service.data_version}.{self.analytics_service.model_version}"
+
+    async def subscribe(self):
+        """Register a client queue, primed with the full current state"""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        if self._task is None or self._task.done():
+            self._ready.clear()
+            self._task = asyncio.create_task(self._run())
+
+        ready = asyncio.ensure_future(self._ready.wait())
+        await asyncio.wait([ready, self._task], return_when=asyncio.FIRST_COMPLETED)
+        if not ready.done():
+            # The publisher died before producing a first state
+            ready.cancel()
+            self._subscribers.discard(queue)
+            self._task.result()
+        queue.put_nowait(self._snapshot_frame)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+        if not self._subscribers and self._task is not None:
+            # Nobody is listening, so stop recomputing until the next client arrives
+            self._task.cancel()
+            self._task = None
+            self._version = None
+
+    async def _run(self):
+        try:
+            while True:
+                version = self.current_version()
+                if version != self._version:
+                    await self._refresh(version)
+                await asyncio.sleep(self.poll_interval)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Dashboard publisher stopped: {e}")
+            raise
+
+    async def _refresh(self, version):
+        """Compute panels once, diff them against the last state and broadcast the changes"""
+        changes = {}
+        async for message in self.analytics_service.stream_dashboard(self.panels):
+            if 'error' in message:
+                logger.warning(f"Skipping panel '{message['panel']}' in push update: {message['error']}")
+                continue
+            panel, data = message['panel'], jsonable_encoder(message['data'])
+            previous = self._state.get(panel, {})
+            changed = {key: value for key, value in data.items() if previous.get(key) != value}
+            if changed:
+                changes[panel] = changed
+                self._state[panel] = data
+
+        self._version = version
+        self._snapshot_frame = format_sse('snapshot', {'version': version, 'panels': self._state}, version)
+        if not self._ready.is_set():
+            self._ready.set()
+            return
+
+        if changes:
+            # Encoded once, shared by every connected client
+            frame = format_sse('update', {'version': version, 'panels': changes}, version)
+            self._broadcast(frame)
+            logger.info(f"Pushed {len(changes)} changed panels to {len(self._subscribers)} subscribers")
+
+    def _broadcast(self, frame):
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                # A slow client missed diffs; replace its backlog with a full resync
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self._snapshot_frame)
@@ -2,13 +2,133 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import random
+import threading
+import logging
+import json
+import os
+from app.utils.key_dictionary import KeyDictionary
+from app.utils.daily_index import DailyIndex
+from app.utils.sketches import DistinctCountCube
+
+logger = logging.getLogger(__name__)
+
+CHURN_WINDOW_DAYS = 60
+
+ORDER_COLUMNS = ['order_id', 'customer_id', 'order_date', 'total_amount', 'product_category']
+CUSTOMER_COLUMNS = ['customer_id', 'age', 'gender', 'location', 'registration_date']
+REVIEW_COLUMNS = ['review_id', 'customer_id', 'product_id', 'rating', 'review_text', 'review_date']
+# String IDs are stored as dense integer codes; customer codes double as row positions
+ID_COLUMNS = ['customer_id', 'order_id', 'review_id', 'product_id']
+SNAPSHOT_TABLES = {'customers': '_customer_data', 'sales': '_sales_data', 'reviews': '_reviews_data'}
+# Rough per-key overhead of a KeyDictionary entry (dict slot, list slot, str header)
+_KEY_OVERHEAD_BYTES = 120
+# Customer rows featurized at a time when a drift monitor is (re)filled from the whole table
+MONITOR_CHUNK_SIZE = 100000
+
+class InsufficientDataError(Exception):
+    """Raised when the stored data is too small to fit a model yet, e.g. in a tenant that was just created"""
+
 
 class DataService:
-    def __init__(self):
+    def __init__(self, sample_data=True):
         self._sales_data = None
         self._customer_data = None
         self._reviews_data = None
-        self._generate_sample_data()
+        self._daily_index = DailyIndex()
+        self._distinct_cube = DistinctCountCube()
+        self.keys = {column: KeyDictionary() for column in ID_COLUMNS}
+        self.reference_date = None
+        self._lock = threading.RLock()
+        self.data_version = 0
+        # Table size kept current by the write paths, so reading it never waits on an ingest
+        self._table_bytes = 0
+        # Drift monitors kept current on every append: name -> (monitor, featurize) over customer
+        # rows, and name -> (monitor, first day) over daily revenue totals from that day on
+        self._customer_monitors = {}
+        self._daily_monitors = {}
+        if sample_data:
+            self._generate_sample_data()
+        else:
+            self._initialize_empty()
+        self._table_bytes = self._measure_tables()
+
+    def _initialize_empty(self):
+        """Start with empty tables that ingestion appends to"""
+        customers = pd.DataFrame({
+            'customer_id': pd.Series(dtype=object), 'age': pd.Series(dtype=np.int64),
+            'gender': pd.Series(dtype=object), 'location': pd.Series(dtype=object),
+            'registration_date': pd.Series(dtype='datetime64[us]')
+        })
+        self._customer_data = self._compact_customers(customers).assign(**self._empty_customer_features(0))
+        self._sales_data = self._compact_orders(pd.DataFrame({
+            'order_id': pd.Series(dtype=object), 'customer_id': pd.Series(dtype=object),
+            'order_date': pd.Series(dtype='datetime64[us]'), 'total_amount': pd.Series(dtype=np.float64),
+            'product_category': pd.Series(dtype=object)
+        }))
+        reviews = pd.DataFrame({
+            'review_id': pd.Series(dtype=object), 'customer_id': pd.Series(dtype=object),
+            'product_id': pd.Series(dtype=object), 'rating': pd.Series(dtype=np.int64),
+            'review_text': pd.Series(dtype=str), 'sentiment': pd.Series(dtype=object),
+            'review_date': pd.Series(dtype='datetime64[us]')
+        })
+        self._reviews_data = self._compact_reviews(reviews)
+
+    @property
+    def nbytes(self):
+        """Approximate resident size of the tables, ID dictionaries and indexes; lock-free"""
+        keys = sum(len(keys) for keys in self.keys.values()) * _KEY_OVERHEAD_BYTES
+        return self._table_bytes + keys + self._daily_index.nbytes + self._distinct_cube.nbytes
+
+    def _measure_tables(self):
+        return sum(int(getattr(self, attr).memory_usage(deep=True).sum()) for attr in SNAPSHOT_TABLES.values())
+
+    def row_counts(self):
+        """Rows per stored table"""
+        with self._lock:
+            return {table: len(getattr(self, attr)) for table, attr in SNAPSHOT_TABLES.items()}
+
+    def save_snapshot(self, path):
+        """Write every table column by column, plus the ID dictionaries, to one .npz file"""
+        arrays = {}
+        meta = {'data_version': self.data_version, 'tables': {}}
+        with self._lock:
+            for table, attr in SNAPSHOT_TABLES.items():
+                frame = getattr(self, attr)
+                meta['tables'][table] = {col: str(dtype) for col, dtype in frame.dtypes.items()}
+                for col in frame.columns:
+                    arrays.update(_encode_column(f'{table}/{col}', frame[col]))
+            for column, keys in self.keys.items():
+                arrays[f'keys/{column}'] = np.asarray(keys._keys, dtype=str)
+            if self.reference_date is not None:
+                meta['reference_date'] = self.reference_date.isoformat()
+
+        arrays['meta'] = np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        # Replace atomically so a crash mid-write never leaves a torn snapshot behind
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load_snapshot(cls, path):
+        """Restore a DataService written by save_snapshot, rebuilding the day and distinct-count indexes"""
+        service = cls(sample_data=False)
+        with np.load(path, allow_pickle=False) as arrays:
+            meta = json.loads(arrays['meta'].tobytes())
+            for column in ID_COLUMNS:
+                service.keys[column] = KeyDictionary(arrays[f'keys/{column}'].astype(object))
+            for table, dtypes in meta['tables'].items():
+                setattr(service, SNAPSHOT_TABLES[table], pd.DataFrame({
+                    col: _decode_column(arrays, f'{table}/{col}', dtype) for col, dtype in dtypes.items()
+                }))
+
+        service.data_version = meta['data_version']
+        if 'reference_date' in meta:
+            service.reference_date = pd.Timestamp(meta['reference_date'])
+        # Indexes are derived from the orders, so they are rebuilt rather than stored
+        service._index_orders(service._sales_data)
+        service._table_bytes = service._measure_tables()
+        return service
     
     def _generate_sample_data(self):
         """Generate realistic sample data for demonstration"""
@@ -110,50 +230,416 @@ class DataService:
                 'review_date': random.choice(dates)
             })
         
-        # Convert to DataFrames
-        self._sales_data = pd.DataFrame(sales_records)
-        self._customer_data = pd.DataFrame(customer_records)
-        self._reviews_data = pd.DataFrame(review_records)
+        # Convert to compact DataFrames (customers first so codes follow row order)
+        self._customer_data = self._compact_customers(pd.DataFrame(customer_records))
+        self._sales_data = self._compact_orders(pd.DataFrame(sales_records))
+        self._reviews_data = self._compact_reviews(pd.DataFrame(review_records))
         
         # Add churn labels to customer data
         self._add_churn_labels()
+        self._index_orders(self._sales_data)
+
+    def _compact_customers(self, customers):
+        """Encode customer IDs and store demographics as categoricals"""
+        return customers.assign(
+            customer_id=self.keys['customer_id'].encode(customers['customer_id']),
+            gender=customers['gender'].astype('category'),
+            location=customers['location'].astype('category')
+        )
+
+    def _compact_orders(self, orders):
+        """Encode order and customer IDs, with float32 amounts and categorical product category"""
+        return orders.assign(
+            order_id=self.keys['order_id'].encode(orders['order_id']),
+            customer_id=self.keys['customer_id'].encode(orders['customer_id'], add=False),
+            total_amount=orders['total_amount'].astype(np.float32),
+            product_category=orders['product_category'].astype('category')
+        )
+
+    def _compact_reviews(self, reviews):
+        """Encode review, customer and product IDs, with categorical sentiment labels"""
+        compact = reviews.assign(
+            review_id=self.keys['review_id'].encode(reviews['review_id']),
+            customer_id=self.keys['customer_id'].encode(reviews['customer_id'], add=False),
+            product_id=self.keys['product_id'].encode(reviews['product_id']),
+            rating=reviews['rating'].astype(np.int8)
+        )
+        if 'sentiment' in compact.columns:
+            compact['sentiment'] = compact['sentiment'].astype('category')
+        return compact
+
+    def _append_frame(self, current, batch, categorical_columns):
+        """Concatenate a batch, unioning categories so categorical columns keep their dtype"""
+        for col in categorical_columns:
+            if col not in current.columns:
+                continue
+            values = batch[col] if col in batch.columns else pd.Series(None, index=batch.index, dtype=object)
+            categories = current[col].cat.categories.union(pd.Index(values.dropna().unique()))
+            current[col] = current[col].cat.set_categories(categories)
+            batch[col] = pd.Categorical(values, categories=categories)
+        # Only the appended rows are measured; in-place updates barely change the size
+        self._table_bytes += int(batch.memory_usage(deep=True).sum())
+        return pd.concat([current, batch.reindex(columns=current.columns)], ignore_index=True)
+
+    def decode_ids(self, column, codes):
+        """Decode integer ID codes back to their original strings"""
+        return self.keys[column].decode(codes)
     
     def _add_churn_labels(self):
-        """Add churn labels based on recent activity"""
-        recent_date = self._sales_data['order_date'].max() - timedelta(days=60)
-        recent_customers = self._sales_data[
-            self._sales_data['order_date'] >= recent_date
-        ]['customer_id'].unique()
-        
-        self._customer_data['is_churned'] = ~self._customer_data['customer_id'].isin(recent_customers)
-        
-        # Add customer features for churn prediction
-        customer_stats = self._sales_data.groupby('customer_id').agg({
-            'total_amount': ['sum', 'mean', 'count'],
-            'order_date': ['min', 'max']
-        }).reset_index()
-        
-        customer_stats.columns = [
-            'customer_id', 'total_spent', 'avg_order_value', 'order_count', 'first_order', 'last_order'
-        ]
-        
-        # Calculate days since last order
-        max_date = self._sales_data['order_date'].max()
-        customer_stats['days_since_last_order'] = (max_date - customer_stats['last_order']).dt.days
-        customer_stats['customer_lifetime_days'] = (customer_stats['last_order'] - customer_stats['first_order']).dt.days
-        
-        # Merge with customer data
-        self._customer_data = self._customer_data.merge(customer_stats, on='customer_id', how='left')
-        self._customer_data = self._customer_data.fillna(0)
+        """Add churn labels and order features, starting every customer from zero activity"""
+        self._customer_data = self._customer_data.assign(**self._empty_customer_features(len(self._customer_data)))
+        self.reference_date = None
+        self._apply_order_batch(self._sales_data)
+
+    def _empty_customer_features(self, n):
+        """Feature columns for customers that have not ordered yet"""
+        return {
+            'is_churned': np.ones(n, dtype=bool),
+            'total_spent': np.zeros(n),
+            'avg_order_value': np.zeros(n),
+            'order_count': np.zeros(n, dtype=np.int64),
+            'first_order': np.full(n, np.datetime64('NaT'), dtype='datetime64[us]'),
+            'last_order': np.full(n, np.datetime64('NaT'), dtype='datetime64[us]'),
+            'days_since_last_order': np.zeros(n, dtype=np.int64),
+            'customer_lifetime_days': np.zeros(n, dtype=np.int64)
+        }
+
+    def _set_customer_rows(self, positions, values):
+        """Write feature values for the given customer row positions in place"""
+        for col, vals in values.items():
+            self._customer_data.iloc[positions, self._customer_data.columns.get_loc(col)] = vals
+
+    def _apply_order_batch(self, orders):
+        """Fold a batch of orders into the features of only the customers it touches"""
+        if orders.empty:
+            return
+
+        # Accumulate float32 amounts in float64
+        amounts = orders['total_amount'].astype(np.float64).groupby(orders['customer_id'])
+        dates = orders['order_date'].groupby(orders['customer_id'])
+        batch_spent = amounts.sum()
+        # Customer codes are row positions in the customer table
+        positions = batch_spent.index.to_numpy()
+
+        batch_max = orders['order_date'].max()
+        # A later reference date shifts recency for every customer, so monitors are refilled below
+        advances = self.reference_date is None or batch_max > self.reference_date
+        if not advances:
+            self._unmonitor_customers(positions)
+
+        data = self._customer_data
+        total_spent = data['total_spent'].to_numpy()[positions] + batch_spent.to_numpy()
+        order_count = data['order_count'].to_numpy()[positions] + amounts.count().to_numpy()
+        first_order = np.fmin(data['first_order'].to_numpy()[positions], dates.min().to_numpy())
+        last_order = np.fmax(data['last_order'].to_numpy()[positions], dates.max().to_numpy())
+
+        self._set_customer_rows(positions, {
+            'total_spent': total_spent,
+            'order_count': order_count,
+            'avg_order_value': total_spent / order_count,
+            'first_order': first_order,
+            'last_order': last_order,
+            'customer_lifetime_days': (last_order - first_order).astype('timedelta64[D]').astype(np.int64)
+        })
+
+        if advances:
+            self.set_reference_date(batch_max)
+        else:
+            since_last = self.reference_date.to_datetime64() - last_order
+            self._set_customer_rows(positions, {
+                'days_since_last_order': since_last.astype('timedelta64[D]').astype(np.int64),
+                'is_churned': since_last > np.timedelta64(CHURN_WINDOW_DAYS, 'D')
+            })
+            self._monitor_customers(positions)
+
+    def set_reference_date(self, reference_date):
+        """Recompute recency and churn labels for all customers against a new reference date"""
+        with self._lock:
+            self.reference_date = pd.Timestamp(reference_date)
+            since_last = self.reference_date - self._customer_data['last_order']
+            self._customer_data['days_since_last_order'] = since_last.dt.days.fillna(0).astype(np.int64)
+            # Customers with no orders (NaT) fail the comparison and count as churned
+            self._customer_data['is_churned'] = ~(since_last <= timedelta(days=CHURN_WINDOW_DAYS))
+            for monitor, featurize in self._customer_monitors.values():
+                self._fill_customer_monitor(monitor, featurize)
     
+    def _validate(self, records, columns, kind):
+        """Check required columns and return them in canonical order"""
+        missing = [col for col in columns if col not in records.columns]
+        if missing:
+            raise ValueError(f"{kind} records missing columns: {', '.join(missing)}")
+        return records[columns + [c for c in records.columns if c not in columns]].copy()
+
+    def _upsert_customers(self, customers):
+        """Update demographics of known customers and append rows for new ones"""
+        customers = customers.drop_duplicates('customer_id', keep='last')
+        batch = self._compact_customers(customers)
+        codes = batch['customer_id'].to_numpy()
+
+        known = codes < len(self._customer_data)
+        if known.any():
+            for col in ['gender', 'location']:
+                categories = self._customer_data[col].cat.categories.union(pd.Index(batch[col].dropna().unique()))
+                self._customer_data[col] = self._customer_data[col].cat.set_categories(categories)
+            self._unmonitor_customers(codes[known])
+            self._set_customer_rows(codes[known], {
+                col: batch[col].to_numpy()[known] for col in CUSTOMER_COLUMNS[1:]
+            })
+            self._monitor_customers(codes[known])
+
+        # New codes are allocated sequentially, so appended rows stay aligned with their codes
+        new = batch[~known].sort_values('customer_id')
+        new = new.assign(**self._empty_customer_features(len(new)))
+        first_new = len(self._customer_data)
+        self._customer_data = self._append_frame(self._customer_data, new, ['gender', 'location'])
+        self._monitor_customers(np.arange(first_new, len(self._customer_data)))
+
+    def _register_unknown_customers(self, customer_ids):
+        """Create placeholder customer rows for IDs first seen in orders or reviews"""
+        unknown = pd.unique(customer_ids[self.keys['customer_id'].encode(customer_ids, add=False) < 0])
+        if len(unknown):
+            logger.info(f"Registering {len(unknown)} customers first seen in activity data")
+            self._upsert_customers(pd.DataFrame({
+                'customer_id': unknown,
+                'age': 0,
+                'gender': None,
+                'location': None,
+                'registration_date': pd.NaT
+            }))
+
+    def append_orders(self, orders):
+        """Append a batch of orders and refresh the aggregates derived from them"""
+        orders = self._validate(orders, ORDER_COLUMNS, 'order')
+        orders['order_date'] = pd.to_datetime(orders['order_date'])
+
+        with self._lock:
+            self._register_unknown_customers(orders['customer_id'].to_numpy(dtype=object))
+            orders = self._compact_orders(orders[ORDER_COLUMNS])
+            self._sales_data = self._append_frame(self._sales_data, orders, ['product_category'])
+
+            self._index_orders(orders)
+            self._apply_order_batch(orders)
+            self.data_version += 1
+            return self.data_version
+
+    def append_customers(self, customers):
+        """Insert new customers or update demographics of known ones"""
+        customers = self._validate(customers, CUSTOMER_COLUMNS, 'customer')[CUSTOMER_COLUMNS]
+        customers['registration_date'] = pd.to_datetime(customers['registration_date'])
+
+        with self._lock:
+            self._upsert_customers(customers)
+            self.data_version += 1
+            return self.data_version
+
+    def append_reviews(self, reviews):
+        """Append a batch of product reviews"""
+        reviews = self._validate(reviews, REVIEW_COLUMNS, 'review')
+        reviews['review_date'] = pd.to_datetime(reviews['review_date'])
+        columns = REVIEW_COLUMNS + (['sentiment'] if 'sentiment' in reviews.columns else [])
+
+        with self._lock:
+            self._register_unknown_customers(reviews['customer_id'].to_numpy(dtype=object))
+            reviews = self._compact_reviews(reviews[columns])
+            self._reviews_data = self._append_frame(self._reviews_data, reviews, ['sentiment'])
+            self.data_version += 1
+            return self.data_version
+
     def get_sales_data(self):
         """Get sales data"""
-        return self._sales_data.copy()
+        with self._lock:
+            return self._sales_data.copy()
     
     def get_customer_data(self):
         """Get customer data"""
-        return self._customer_data.copy()
+        with self._lock:
+            return self._customer_data.copy()
     
+    def get_customers(self, customer_ids):
+        """Customer rows for a list of IDs through the ID hash index, plus the IDs that are unknown"""
+        customer_ids = np.asarray(customer_ids, dtype=object)
+        # Customer codes are row positions, so the index lookup is the row lookup
+        codes = self.keys['customer_id'].encode(customer_ids, add=False)
+        found = codes >= 0
+        with self._lock:
+            rows = self._customer_data.iloc[codes[found]]
+        return rows, customer_ids[~found].tolist()
+
     def get_reviews_data(self):
         """Get reviews data"""
-        return self._reviews_data.copy()
\ No newline at end of file
+        with self._lock:
+            return self._reviews_data.copy()
+
+    def get_reviews_since(self, position):
+        """Reviews appended at or after a row position, plus the current row count"""
+        with self._lock:
+            return self._reviews_data.iloc[position:].copy(deep=False), len(self._reviews_data)
+
+    def snapshot(self):
+        """Consistent view of every table for one computation pass.
+
+        Frames are shallow copies: under pandas 3 copy-on-write (always on, hence
+        the pandas>=3.0 pin), later appends and in-place feature updates never show
+        through, and nothing is copied up front.
+        """
+        with self._lock:
+            return {
+                'sales': self._sales_data.copy(deep=False),
+                'customers': self._customer_data.copy(deep=False),
+                'reviews': self._reviews_data.copy(deep=False),
+                'daily_sales': self._daily_sales_frame(),
+                'data_version': self.data_version
+            }
+
+    def get_daily_sales(self):
+        """Get total sales per day as a ds/y frame"""
+        with self._lock:
+            return self._daily_sales_frame()
+
+    def get_daily_sales_by(self, column='product_category'):
+        """Get sales per day for each value of an order column, as ds/y frames keyed by value"""
+        with self._lock:
+            sales = self._sales_data
+        daily = sales.groupby([sales[column], sales['order_date'].dt.floor('D')], observed=True)['total_amount'].sum()
+        return {
+            str(key): group.droplevel(0).rename_axis('ds').rename('y').astype(np.float64).reset_index()
+            for key, group in daily.groupby(level=0, observed=True)
+        }
+
+    def _daily_sales_frame(self):
+        days, revenue = self._daily_index.daily_totals()
+        return pd.DataFrame({'ds': pd.to_datetime(days), 'y': revenue})
+
+    def _index_orders(self, orders):
+        """Fold orders into the per-day prefix index and distinct-customer cube; only the batch's days change"""
+        customer_codes = orders['customer_id'].to_numpy()
+        batch_days = np.unique(orders['order_date'].to_numpy().astype('datetime64[D]'))
+        self._update_daily_monitors(batch_days, remove=True)
+        self._daily_index.add_orders(orders['order_date'].to_numpy(), orders['total_amount'].to_numpy())
+        self._update_daily_monitors(batch_days)
+        # Orders are bucketed under the customer's location at ingest time
+        self._distinct_cube.add(
+            orders['order_date'].to_numpy(),
+            self._dimension_values(orders['product_category']),
+            self._dimension_values(self._customer_data['location'].iloc[customer_codes]),
+            customer_codes
+        )
+
+    def monitor_customers(self, name, monitor, featurize):
+        """Keep a drift monitor over featurize(customer rows) current as customers and orders arrive"""
+        with self._lock:
+            self._customer_monitors[name] = (monitor, featurize)
+            self._fill_customer_monitor(monitor, featurize)
+
+    def monitor_daily_sales(self, name, monitor, first_day):
+        """Keep a drift monitor over the daily revenue totals from first_day on current as orders arrive"""
+        with self._lock:
+            self._daily_monitors[name] = (monitor.clear(), np.datetime64(first_day, 'D'))
+            days, revenue = self._daily_index.daily_totals()
+            monitor.update(pd.DataFrame({'y': revenue[days >= np.datetime64(first_day, 'D')]}))
+
+    def monitor_state(self, name):
+        """Copy of a registered monitor as of the current data version, or None"""
+        with self._lock:
+            entry = self._customer_monitors.get(name) or self._daily_monitors.get(name)
+            return entry[0].copy() if entry is not None else None
+
+    def _fill_customer_monitor(self, monitor, featurize):
+        monitor.clear()
+        for start in range(0, len(self._customer_data), MONITOR_CHUNK_SIZE):
+            monitor.update(featurize(self._customer_data.iloc[start:start + MONITOR_CHUNK_SIZE]))
+
+    def _unmonitor_customers(self, positions):
+        """Take customer rows out of the monitors before their features are overwritten"""
+        if self._customer_monitors and len(positions):
+            rows = self._customer_data.iloc[positions]
+            for monitor, featurize in self._customer_monitors.values():
+                monitor.remove(featurize(rows))
+
+    def _monitor_customers(self, positions):
+        if self._customer_monitors and len(positions):
+            rows = self._customer_data.iloc[positions]
+            for monitor, featurize in self._customer_monitors.values():
+                monitor.update(featurize(rows))
+
+    def _update_daily_monitors(self, batch_days, remove=False):
+        """Fold the current totals of the batch's days into the daily monitors, or take them out"""
+        if not self._daily_monitors or self._daily_index.origin is None:
+            return
+        days, revenue = self._daily_index.daily_totals()
+        touched = np.isin(days, batch_days)
+        for monitor, first_day in self._daily_monitors.values():
+            totals = pd.DataFrame({'y': revenue[touched & (days >= first_day)]})
+            if remove:
+                monitor.remove(totals)
+            else:
+                monitor.update(totals)
+
+    @staticmethod
+    def _dimension_values(values):
+        return values.astype(object).fillna('Unknown').to_numpy()
+
+    def window_totals(self, start=None, end=None):
+        """Revenue, orders and approximate active customers for an inclusive date window"""
+        with self._lock:
+            totals = self._daily_index.window(start, end)
+            # Counted from the same sketches as active_customers(), so both report the same number
+            totals['active_customers'] = self._distinct_cube.estimate(start, end)
+            return totals
+
+    @property
+    def distinct_count_error(self):
+        """Standard relative error of the sketched distinct counts"""
+        return self._distinct_cube.relative_error
+
+    def active_customers(self, start=None, end=None, categories=None, locations=None, group_by=None, exact=False):
+        """Distinct customers with orders in an inclusive date window, filtered by category and location.
+
+        Answered from HyperLogLog sketches by default; exact mode counts over the orders for validation.
+        """
+        with self._lock:
+            if not exact:
+                return self._distinct_cube.estimate(start, end, categories, locations, group_by)
+
+            sales = self._sales_data
+            dims = pd.DataFrame({
+                'customer_id': sales['customer_id'].to_numpy(),
+                'category': self._dimension_values(sales['product_category']),
+                'location': self._dimension_values(self._customer_data['location'].iloc[sales['customer_id'].to_numpy()])
+            })
+        days = sales['order_date'].dt.floor('D')
+        mask = np.ones(len(dims), dtype=bool)
+        if start is not None:
+            mask &= (days >= pd.Timestamp(start)).to_numpy()
+        if end is not None:
+            mask &= (days <= pd.Timestamp(end)).to_numpy()
+        if categories is not None:
+            mask &= dims['category'].isin(categories).to_numpy()
+        if locations is not None:
+            mask &= dims['location'].isin(locations).to_numpy()
+        dims = dims[mask]
+
+        if group_by is None:
+            return int(dims['customer_id'].nunique())
+        if group_by not in ('category', 'location'):
+            raise ValueError(f"Cannot group distinct counts by '{group_by}'")
+        return {str(key): int(value) for key, value in dims.groupby(group_by)['customer_id'].nunique().items()}
+
+
+def _encode_column(name, values):
+    """Arrays for one column: categorical codes plus categories, or strings with a missing mask"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return {name: values.cat.codes.to_numpy(), f'{name}.categories': np.asarray(values.cat.categories, dtype=str)}
+    if values.dtype == object or pd.api.types.is_string_dtype(values.dtype):
+        return {name: np.asarray(values.fillna('').astype(str), dtype=str), f'{name}.missing': values.isna().to_numpy()}
+    return {name: values.to_numpy()}
+
+
+def _decode_column(arrays, name, dtype):
+    if dtype == 'category':
+        return pd.Categorical.from_codes(arrays[name], arrays[f'{name}.categories'].astype(object))
+    if f'{name}.missing' in arrays:
+        values = arrays[name].astype(object)
+        values[arrays[f'{name}.missing']] = None
+        return pd.Series(values, dtype=dtype)
+    return arrays[name]
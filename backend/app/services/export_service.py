@@ -0,0 +1,125 @@
+import logging
+import pandas as pd
+from app.services.scoring_service import EXPORT_COLUMNS, RISK_LEVELS
+
+logger = logging.getLogger(__name__)
+
+EXPORT_MEDIA_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to a generator instead of keeping them"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _encode_csv(frames):
+    header = True
+    for frame in frames:
+        yield frame.to_csv(index=False, header=header).encode()
+        header = False
+
+
+def _encode_ndjson(frames):
+    for frame in frames:
+        if len(frame):
+            yield frame.to_json(orient='records', lines=True).encode()
+
+
+def _encode_parquet(frames):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    writer = None
+    for frame in frames:
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), table.schema)
+        # One row group per batch; its bytes leave as soon as it is written
+        writer.write_table(table)
+        yield sink.drain()
+    if writer is None:
+        return
+    writer.close()
+    yield sink.drain()
+
+
+class ExportService:
+    """Streams per-customer scores from the scoring table as CSV, NDJSON or Parquet"""
+
+    def __init__(self, data_service, batch_size=50000):
+        self.data_service = data_service
+        self.batch_size = batch_size
+
+    def prepare(self, table, fmt, columns=None, risk_levels=None, clusters=None, order='customer'):
+        """Validate an export request and return (media type, byte-chunk iterator)"""
+        if fmt not in EXPORT_MEDIA_TYPES:
+            raise ValueError(f"Unknown export format '{fmt}'; expected one of {', '.join(EXPORT_MEDIA_TYPES)}")
+        columns = columns or EXPORT_COLUMNS
+        unknown = [column for column in columns if column not in EXPORT_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown export columns: {', '.join(unknown)}")
+        if risk_levels is not None and any(level not in RISK_LEVELS for level in risk_levels):
+            raise ValueError(f"Risk levels must be among {', '.join(RISK_LEVELS)}")
+        if order not in ('customer', 'churn'):
+            raise ValueError("order must be 'customer' or 'churn'")
+        if fmt == 'parquet':
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise ValueError("Parquet export requires pyarrow to be installed")
+
+        # Filters run on the arrays; only surviving rows of the selected columns are encoded
+        rows = table.select(risk_levels, clusters, order)
+        logger.info(f"Exporting {len(rows)} of {len(table)} customers as {fmt}")
+        frames = self._frames(table, rows, columns)
+        if fmt == 'csv':
+            return EXPORT_MEDIA_TYPES[fmt], _encode_csv(frames)
+        if fmt == 'ndjson':
+            return EXPORT_MEDIA_TYPES[fmt], _encode_ndjson(frames)
+        return EXPORT_MEDIA_TYPES[fmt], _encode_parquet(frames)
+
+    def _frames(self, table, rows, columns):
+        empty = True
+        for batch in table.batches(rows, columns, self.batch_size):
+            if 'customer_id' in batch:
+                batch['customer_id'] = self.data_service.decode_ids('customer_id', batch['customer_id'])
+            empty = False
+            yield pd.DataFrame(batch, columns=columns)
+        if empty:
+            # Still emit the header / schema for an export that matched nothing
+            yield pd.DataFrame({column: [] for column in columns}, columns=columns)
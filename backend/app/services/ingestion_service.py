@@ -0,0 +1,164 @@
+import asyncio
+import io
+import json
+import queue
+import threading
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+ARROW_TYPES = ('application/vnd.apache.arrow.stream',)
+
+
+class IngestionBusyError(Exception):
+    """Raised when the ingestion slots stay occupied past the acquire timeout"""
+
+    def __init__(self, retry_after):
+        super().__init__("Ingestion is at capacity, retry later")
+        self.retry_after = retry_after
+
+
+class _QueueReader(io.RawIOBase):
+    """Blocking file-like view over byte chunks pushed into a bounded queue"""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._buffer = b''
+        self._closed_stream = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer and not self._closed_stream:
+            chunk = self._chunks.get()
+            if chunk is None:
+                self._closed_stream = True
+            else:
+                self._buffer = chunk
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+class IngestionService:
+    """Stream-parses NDJSON or Arrow IPC request bodies into DataService appends"""
+
+    def __init__(self, data_service, chunk_size=10000, max_concurrent=4, acquire_timeout=5.0,
+                 max_line_bytes=1 << 20):
+        self.data_service = data_service
+        self.chunk_size = chunk_size
+        self.acquire_timeout = acquire_timeout
+        self.max_line_bytes = max_line_bytes
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._appenders = {
+            'orders': data_service.append_orders,
+            'customers': data_service.append_customers,
+            'reviews': data_service.append_reviews
+        }
+
+    async def ingest(self, kind, body, content_type):
+        """Ingest one request body, returning row/chunk counts and the resulting data version"""
+        if kind not in self._appenders:
+            raise ValueError(f"Unknown ingestion target '{kind}'")
+
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise IngestionBusyError(retry_after=max(1, int(self.acquire_timeout)))
+
+        try:
+            media_type = (content_type or '').split(';')[0].strip().lower()
+            if media_type in ARROW_TYPES:
+                stats = await self._ingest_arrow(kind, body)
+            elif media_type in NDJSON_TYPES or media_type in ('', 'application/json'):
+                stats = await self._ingest_ndjson(kind, body)
+            else:
+                raise ValueError(f"Unsupported content type '{content_type}'")
+        finally:
+            self._slots.release()
+
+        logger.info(f"Ingested {stats['rows_ingested']} {kind} in {stats['chunks']} chunks")
+        return {'kind': kind, **stats, 'data_version': self.data_service.data_version}
+
+    async def _append(self, kind, frame):
+        # Appending in a worker thread and awaiting it before reading further
+        # stalls the body stream, pushing backpressure onto the client
+        await asyncio.to_thread(self._appenders[kind], frame)
+
+    async def _ingest_ndjson(self, kind, body):
+        rows = 0
+        chunks = 0
+        records = []
+        pending = b''
+
+        async for data in body:
+            *lines, pending = (pending + data).split(b'\n')
+            if len(pending) > self.max_line_bytes:
+                raise ValueError(f"NDJSON line exceeds {self.max_line_bytes} bytes")
+            for line in lines:
+                if line.strip():
+                    records.append(json.loads(line))
+
+            if len(records) >= self.chunk_size:
+                await self._append(kind, pd.DataFrame.from_records(records))
+                rows += len(records)
+                chunks += 1
+                records = []
+
+        if pending.strip():
+            records.append(json.loads(pending))
+        if records:
+            await self._append(kind, pd.DataFrame.from_records(records))
+            rows += len(records)
+            chunks += 1
+
+        return {'rows_ingested': rows, 'chunks': chunks}
+
+    async def _ingest_arrow(self, kind, body):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ValueError("Arrow IPC ingestion requires pyarrow to be installed")
+
+        # Small bounded queue: the network reader blocks once the decoder falls behind
+        chunks_queue = queue.Queue(maxsize=8)
+        decoder_finished = threading.Event()
+        loop = asyncio.get_running_loop()
+
+        def decode():
+            rows = 0
+            chunks = 0
+            try:
+                reader = pa.ipc.open_stream(io.BufferedReader(_QueueReader(chunks_queue)))
+                for batch in reader:
+                    for start in range(0, batch.num_rows, self.chunk_size):
+                        frame = batch.slice(start, self.chunk_size).to_pandas()
+                        self._appenders[kind](frame)
+                        rows += len(frame)
+                        chunks += 1
+            finally:
+                decoder_finished.set()
+            return {'rows_ingested': rows, 'chunks': chunks}
+
+        def feed(item):
+            while not decoder_finished.is_set():
+                try:
+                    chunks_queue.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        decoder = loop.run_in_executor(None, decode)
+        try:
+            async for data in body:
+                await loop.run_in_executor(None, feed, data)
+                if decoder_finished.is_set():
+                    break
+        finally:
+            await loop.run_in_executor(None, feed, None)
+
+        return await decoder
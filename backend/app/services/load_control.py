@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+from fastapi import Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.routing import APIRoute
+from app.utils.deadline import RequestBudget, set_budget, reset_budget
+
+logger = logging.getLogger(__name__)
+
+# How often a running request checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = 0.25
+# Weight of the newest request in the running service-time average behind Retry-After
+_SERVICE_TIME_ALPHA = 0.2
+# Not an IANA status; nginx's "client closed request", logged for requests nobody is waiting on
+CLIENT_CLOSED_REQUEST = 499
+
+
+class EndpointPolicy:
+    """Deadline and concurrency limits of one endpoint"""
+
+    def __init__(self, deadline, max_concurrent, max_waiting=None, wait_timeout=1.0, serve_stale=False):
+        self.deadline = deadline
+        self.max_concurrent = max_concurrent
+        self.max_waiting = 2 * max_concurrent if max_waiting is None else max_waiting
+        self.wait_timeout = wait_timeout
+        self.serve_stale = serve_stale
+
+
+class AdmissionController:
+    """Caps the requests an endpoint runs at once; beyond a short queue, requests are shed"""
+
+    def __init__(self, policy):
+        self.policy = policy
+        self._slots = asyncio.Semaphore(policy.max_concurrent)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self.deadline_exceeded = 0
+        self.disconnected = 0
+        self.stale_served = 0
+        # Answered requests whose abandoned worker threads still hold their slot
+        self.draining = 0
+        self.service_time = None
+
+    async def admit(self, budget_remaining):
+        """Take a slot, waiting at most the policy's wait timeout; False means the request is shed"""
+        if not self._slots.locked():
+            await self._slots.acquire()
+        elif self.waiting >= self.policy.max_waiting:
+            self.shed += 1
+            return False
+        else:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), min(self.policy.wait_timeout, budget_remaining))
+            except asyncio.TimeoutError:
+                self.shed += 1
+                return False
+            finally:
+                self.waiting -= 1
+        self.active += 1
+        self.admitted += 1
+        return True
+
+    def release(self, elapsed):
+        self.active -= 1
+        self._slots.release()
+        if self.service_time is None:
+            self.service_time = elapsed
+        else:
+            self.service_time += _SERVICE_TIME_ALPHA * (elapsed - self.service_time)
+
+    def retry_after(self):
+        """Seconds until the queue ahead of a new request is likely to have drained"""
+        per_request = self.service_time if self.service_time is not None else self.policy.deadline
+        return max(1, math.ceil(per_request * (self.waiting + 1) / self.policy.max_concurrent))
+
+    def stats(self):
+        return {
+            'deadline_seconds': self.policy.deadline,
+            'max_concurrent': self.policy.max_concurrent,
+            'max_waiting': self.policy.max_waiting,
+            'serve_stale': self.policy.serve_stale,
+            'active': self.active,
+            'waiting': self.waiting,
+            'admitted': self.admitted,
+            'shed': self.shed,
+            'deadline_exceeded': self.deadline_exceeded,
+            'disconnected': self.disconnected,
+            'stale_served': self.stale_served,
+            'draining': self.draining,
+            'avg_service_seconds': round(self.service_time, 4) if self.service_time is not None else None
+        }
+
+
+class StaleResultCache:
+    """Last successful response per endpoint and request, served when fresh work is shed or times out"""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def key(self, request, name):
+        if request.method != 'GET':
+            return None
+        # The tenant comes from the path prefix (already a path parameter) or the header
+        return (
+            name,
+            request.headers.get('x-tenant-id'),
+            tuple(sorted(request.path_params.items())),
+            tuple(sorted(request.query_params.multi_items())),
+            request.headers.get('accept-encoding', '')
+        )
+
+    def store(self, request, name, response):
+        key = self.key(request, name)
+        if key is None or response.status_code != 200 or isinstance(response, StreamingResponse):
+            return
+        headers = {k: v for k, v in response.headers.items() if k != 'content-length'}
+        self._entries[key] = (time.monotonic(), response.body, headers)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, request, name):
+        key = self.key(request, name)
+        entry = self._entries.get(key) if key is not None else None
+        if entry is None:
+            return None
+        stored_at, body, headers = entry
+        headers = {**headers, 'X-Cache-Status': 'stale', 'Age': str(int(time.monotonic() - stored_at))}
+        return Response(content=body, status_code=200, headers=headers)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class LoadControl:
+    """Per-endpoint deadlines, admission control and stale-result degradation for API routes.
+
+    Each guarded request runs as its own task under a RequestBudget that
+    analytics code polls at its checkpoints. When the deadline passes or a GET
+    client disconnects, the budget is cancelled (stopping worker threads at
+    their next checkpoint) and the task is cancelled; the client gets the last
+    good result where the endpoint opted in, else a 503 or 504. The request's
+    concurrency slot stays taken until its worker threads have returned.
+    """
+
+    def __init__(self, policies, stale_max_entries=512):
+        self.controllers = {name: AdmissionController(policy) for name, policy in policies.items()}
+        self.stale = StaleResultCache(stale_max_entries)
+
+    def route_class(self):
+        """APIRoute subclass that guards every route whose endpoint name has a policy"""
+        load_control = self
+
+        class GuardedRoute(APIRoute):
+            def get_route_handler(self):
+                handler = super().get_route_handler()
+                if self.name not in load_control.controllers:
+                    return handler
+                name = self.name
+
+                async def guarded(request):
+                    return await load_control.handle(request, name, handler)
+
+                return guarded
+
+        return GuardedRoute
+
+    async def handle(self, request, name, handler):
+        controller = self.controllers[name]
+        budget = RequestBudget(controller.policy.deadline)
+        if not await controller.admit(budget.remaining()):
+            logger.warning(f"Shedding {name}: {controller.active} running, {controller.waiting} waiting")
+            return self._degrade(request, name, controller, 503, "Server is busy; retry shortly",
+                                 {'Retry-After': str(controller.retry_after())})
+
+        started = time.monotonic()
+        try:
+            token = set_budget(budget)
+            try:
+                task = asyncio.ensure_future(handler(request))
+            finally:
+                reset_budget(token)
+
+            try:
+                outcome = await self._supervise(request, task, budget)
+            except asyncio.CancelledError:
+                task.cancel()
+                raise
+
+            if outcome == 'disconnected':
+                controller.disconnected += 1
+                logger.info(f"Abandoned {name}: client disconnected")
+                return Response(status_code=CLIENT_CLOSED_REQUEST)
+            if outcome == 'deadline' or (task.exception() is not None and budget.expired):
+                controller.deadline_exceeded += 1
+                logger.warning(f"{name} exceeded its {controller.policy.deadline:g}s deadline")
+                return self._degrade(request, name, controller, 504,
+                                     f"Request exceeded its {controller.policy.deadline:g}s deadline")
+
+            response = task.result()
+            if controller.policy.serve_stale:
+                self.stale.store(request, name, response)
+            return response
+        finally:
+            # A slot is free only once the work is: abandoned threads keep it until they return
+            if budget.running_workers:
+                controller.draining += 1
+
+                def release():
+                    controller.draining -= 1
+                    controller.release(time.monotonic() - started)
+
+                budget.when_idle(release)
+            else:
+                controller.release(time.monotonic() - started)
+
+    async def _supervise(self, request, task, budget):
+        """Wait for the handler task; cancel it on deadline or client disconnect"""
+        # Only bodiless requests can be polled: polling reads from the same receive channel as the body
+        poll_disconnect = request.method == 'GET'
+        while not task.done():
+            timeout = budget.remaining()
+            if poll_disconnect:
+                timeout = min(timeout, DISCONNECT_POLL_SECONDS)
+            await asyncio.wait({task}, timeout=timeout)
+            if task.done():
+                break
+
+            if budget.expired:
+                outcome, reason = 'deadline', f"Deadline of {budget.seconds:g}s exceeded"
+            elif poll_disconnect and await request.is_disconnected():
+                outcome, reason = 'disconnected', "Client disconnected"
+            else:
+                continue
+
+            # Threads stop at their next checkpoint; the task unwinds its dependencies now
+            budget.cancel(reason)
+            task.cancel()
+            await asyncio.wait({task})
+            if not task.cancelled():
+                task.exception()
+            return outcome
+        return 'done'
+
+    def _degrade(self, request, name, controller, status_code, detail, headers=None):
+        if controller.policy.serve_stale:
+            response = self.stale.get(request, name)
+            if response is not None:
+                controller.stale_served += 1
+                return response
+        return JSONResponse({'detail': detail}, status_code=status_code, headers=headers)
+
+    def stats(self):
+        return {
+            'endpoints': {name: controller.stats() for name, controller in self.controllers.items()},
+            'stale_entries': len(self.stale)
+        }
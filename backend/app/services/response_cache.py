@@ -0,0 +1,97 @@
+import gzip
+import json
+import logging
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+
+def accepted_encodings(header):
+    """Content codings a client accepts (q > 0) from its Accept-Encoding header"""
+    accepted = set()
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class ResponseCache:
+    """Encoded JSON bodies per endpoint and data/model version, compressed at most once per encoding.
+
+    Requests carrying the current ETag get a 304 without the body being
+    recomputed; everything else is served from the cached bytes.
+    """
+
+    def __init__(self, min_size=1024, gzip_level=6, brotli_quality=5, namespace=None):
+        self.min_size = min_size
+        self.namespace = namespace
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self._entries = {}
+
+    def etag(self, name, version):
+        # Weak: the representation differs per content coding while the data is the same
+        if self.namespace:
+            # Versions restart per tenant, so the tag must say whose data it describes
+            return f'W/"{self.namespace}-{name}-{version}"'
+        return f'W/"{name}-{version}"'
+
+    @property
+    def nbytes(self):
+        return sum(len(body) for entry in self._entries.values() for body in entry['bodies'].values())
+
+    def _negotiate(self, request, size):
+        if size < self.min_size:
+            return 'identity'
+        accepted = accepted_encodings(request.headers.get('accept-encoding'))
+        if brotli is not None and 'br' in accepted:
+            return 'br'
+        if 'gzip' in accepted:
+            return 'gzip'
+        return 'identity'
+
+    def _body(self, entry, encoding):
+        bodies = entry['bodies']
+        if encoding not in bodies:
+            raw = bodies['identity']
+            if encoding == 'br':
+                bodies['br'] = brotli.compress(raw, quality=self.brotli_quality)
+            else:
+                bodies['gzip'] = gzip.compress(raw, compresslevel=self.gzip_level)
+        return bodies[encoding]
+
+    async def respond(self, request, name, version, compute):
+        """Serve the named payload for a version, computing it only when the cached copy is stale"""
+        etag = self.etag(name, version)
+        headers = {'ETag': etag, 'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache'}
+
+        if_none_match = request.headers.get('if-none-match', '')
+        if if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]:
+            return Response(status_code=304, headers=headers)
+
+        entry = self._entries.get(name)
+        if entry is None or entry['version'] != version:
+            payload = await compute()
+            raw = json.dumps(jsonable_encoder(payload), separators=(',', ':')).encode()
+            entry = {'version': version, 'bodies': {'identity': raw}}
+            self._entries[name] = entry
+
+        encoding = self._negotiate(request, len(entry['bodies']['identity']))
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return Response(content=self._body(entry, encoding), media_type='application/json', headers=headers)
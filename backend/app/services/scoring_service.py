@@ -0,0 +1,191 @@
+import asyncio
+import time
+import numpy as np
+import pandas as pd
+import logging
+from datetime import datetime
+from app.models.churn_prediction import RISK_LEVELS
+from app.models.customer_segmentation import RFM_MONEY_FEATURES
+from app.services.data_service import InsufficientDataError
+
+logger = logging.getLogger(__name__)
+
+CHURN_COLUMNS = ['customer_id', 'churn_probability', 'risk_level']
+EXPORT_COLUMNS = [
+    'customer_id', 'churn_probability', 'risk_level', 'cluster', 'recency', 'frequency',
+    'monetary', 'avg_order_value', 'recency_score', 'frequency_score', 'monetary_score'
+]
+SEGMENT_COLUMNS = [
+    'customer_id', 'recency', 'frequency', 'monetary', 'avg_order_value',
+    'recency_score', 'frequency_score', 'monetary_score', 'cluster'
+]
+
+
+class ScoringTable:
+    """Per-customer churn and segment scores as columnar arrays in customer-code order.
+
+    Rows line up with the customer table, so a customer code is its row; a
+    precomputed churn ranking turns "top at-risk customers" into a slice.
+    """
+
+    def __init__(self, columns, version, segment_summary, feature_importance):
+        self.columns = columns
+        self.version = version
+        self.segment_summary = segment_summary
+        self.feature_importance = feature_importance
+        probabilities = columns['churn_probability']
+        self.churn_rate = float(probabilities.mean()) if len(probabilities) else 0.0
+        self.churn_rank = np.argsort(-probabilities, kind='stable')
+
+    @classmethod
+    def build(cls, customer_data, churn_features, rfm_features, churn_predictor, customer_segmentation, version):
+        """Score every customer with the fitted churn and segmentation models"""
+        probabilities = churn_predictor.predict_proba(churn_features)
+        columns = {
+            'customer_id': customer_data['customer_id'].to_numpy(),
+            'churn_probability': np.asarray(probabilities, dtype=np.float64),
+            'risk_level': churn_predictor.risk_level_codes(probabilities).astype(np.int8),
+            'cluster': customer_segmentation.assign_clusters(rfm_features).astype(np.int16)
+        }
+        for column in SEGMENT_COLUMNS[1:-1]:
+            columns[column] = rfm_features[column].to_numpy()
+            if column in RFM_MONEY_FEATURES:
+                columns[column] = columns[column].round(2)
+
+        segment_summary = customer_segmentation.create_segment_descriptions(
+            rfm_features.assign(cluster=columns['cluster'])
+        )
+        return cls(columns, version, segment_summary, churn_predictor._get_feature_importance())
+
+    def __len__(self):
+        return len(self.columns['customer_id'])
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.columns.values())
+
+    def records(self, rows, columns):
+        """Rows as JSON-ready records, with risk levels decoded to their labels"""
+        data = {column: self.columns[column][rows] for column in columns}
+        if 'risk_level' in data:
+            data['risk_level'] = np.asarray(RISK_LEVELS, dtype=object)[data['risk_level']]
+        frame = pd.DataFrame(data)
+        # Customers without orders have no recency
+        return frame.astype(object).where(frame.notna(), None).to_dict('records')
+
+    def select(self, risk_levels=None, clusters=None, order='customer'):
+        """Row positions passing the risk-level and cluster filters, in customer or churn-rank order"""
+        rows = self.churn_rank if order == 'churn' else np.arange(len(self))
+        mask = np.ones(len(rows), dtype=bool)
+        if risk_levels is not None:
+            codes = [RISK_LEVELS.index(level) for level in risk_levels]
+            mask &= np.isin(self.columns['risk_level'][rows], codes)
+        if clusters is not None:
+            mask &= np.isin(self.columns['cluster'][rows], clusters)
+        return rows[mask]
+
+    def batches(self, rows, columns, batch_size=50000):
+        """Yield the selected rows as column arrays, one bounded batch at a time"""
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            data = {column: self.columns[column][batch] for column in columns}
+            if 'risk_level' in data:
+                data['risk_level'] = np.asarray(RISK_LEVELS, dtype=object)[data['risk_level']]
+            yield data
+
+    def top_churn(self, n=50):
+        return self.records(self.churn_rank[:n], CHURN_COLUMNS)
+
+    def head(self, n=100):
+        return self.records(slice(0, n), SEGMENT_COLUMNS)
+
+
+class ScoringScheduler:
+    """Background job that rebuilds the scoring table on an interval or as soon as data or models change"""
+
+    def __init__(self, analytics_service, interval=300.0, poll_interval=1.0):
+        self.analytics_service = analytics_service
+        self.interval = interval
+        self.poll_interval = poll_interval
+        self.last_refresh = None
+        self.last_duration = None
+        self.last_error = None
+        self.refresh_count = 0
+        self._last_attempt = None
+        # Data/model version that was too small to score; nothing is retried until it changes
+        self._insufficient_version = None
+        self._task = None
+
+    def current_version(self):
+        return f"{self.analytics_service.data_service.data_version}.{self.analytics_service.model_version}"
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _is_due(self):
+        if self._insufficient_version == self.current_version():
+            return False
+        if self._last_attempt is None:
+            return True
+        if time.monotonic() - self._last_attempt >= self.interval:
+            return True
+        # A failed refresh waits for the interval instead of retrying on every poll
+        table = self.analytics_service.scoring_table
+        return self.last_error is None and (table is None or table.version != self.current_version())
+
+    async def _run(self):
+        while True:
+            if self._is_due():
+                try:
+                    await asyncio.to_thread(self.refresh)
+                except InsufficientDataError as e:
+                    # A new tenant has nothing to score until it has been filled through ingestion
+                    logger.debug(f"Scoring refresh skipped: {e}")
+                except Exception as e:
+                    logger.error(f"Scoring refresh failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    def refresh(self):
+        """Rebuild the scoring table now"""
+        self._last_attempt = time.monotonic()
+        start = time.perf_counter()
+        version = self.current_version()
+        try:
+            table = self.analytics_service.refresh_scoring_table()
+        except InsufficientDataError:
+            self._insufficient_version = version
+            raise
+        except Exception as e:
+            self.last_error = str(e)
+            raise
+        self.last_duration = time.perf_counter() - start
+        self.last_refresh = datetime.now()
+        self.last_error = None
+        self.refresh_count += 1
+        logger.info(f"Scored {len(table)} customers in {self.last_duration:.3f}s (version {table.version})")
+        return table
+
+    def status(self):
+        table = self.analytics_service.scoring_table
+        return {
+            'running': self._task is not None and not self._task.done(),
+            'interval_seconds': self.interval,
+            'last_refresh': self.last_refresh.isoformat() if self.last_refresh else None,
+            'last_duration_ms': round(self.last_duration * 1000, 2) if self.last_duration is not None else None,
+            'last_error': self.last_error,
+            'refresh_count': self.refresh_count,
+            'table_version': table.version if table is not None else None,
+            'current_version': self.current_version(),
+            'customers': len(table) if table is not None else 0,
+            'table_bytes': table.nbytes if table is not None else 0
+        }
@@ -0,0 +1,223 @@
+import multiprocessing
+import os
+import numpy as np
+import pandas as pd
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from app.utils.sketches import splitmix64
+from app.models.customer_segmentation import RFMQuantiles
+from app.models.churn_prediction import RISK_LEVELS
+from app.utils.deadline import DeadlineExceeded, check_deadline
+
+logger = logging.getLogger(__name__)
+
+CUSTOMER_SHARD_COLUMNS = [
+    'customer_id', 'age', 'total_spent', 'avg_order_value', 'order_count',
+    'days_since_last_order', 'customer_lifetime_days'
+]
+ORDER_SHARD_COLUMNS = ['customer_id', 'order_id', 'order_date', 'total_amount']
+
+
+def shard_of(customer_codes, n_shards):
+    """Hash-partition integer customer codes into shards"""
+    return (splitmix64(customer_codes) % np.uint64(n_shards)).astype(np.int64)
+
+
+class SharedArrays:
+    """Packs named NumPy arrays into one shared-memory block that workers map without pickling"""
+
+    def __init__(self, arrays):
+        self.layout = []
+        offset = 0
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            offset = (offset + 63) // 64 * 64  # keep every array cache-line aligned
+            self.layout.append((name, array.dtype.str, array.shape, offset))
+            offset += array.nbytes
+
+        self._shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        self.name = self._shm.name
+        for (name, _, _, _), view in zip(self.layout, self.attach(self._shm, self.layout).values()):
+            view[...] = arrays[name]
+
+    @staticmethod
+    def attach(shm, layout):
+        """Zero-copy views over a shared block"""
+        return {
+            name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+            for name, dtype, shape, offset in layout
+        }
+
+    def close(self):
+        self._shm.close()
+        self._shm.unlink()
+
+
+class AnalyticsSummary:
+    """Mergeable per-customer analytics aggregates: sums, counts and a bounded top-K"""
+
+    def __init__(self, n_clusters, top_k):
+        self.n_clusters = n_clusters
+        self.top_k = top_k
+        self.n_customers = 0
+        self.churn_probability_sum = 0.0
+        self.risk_counts = np.zeros(len(RISK_LEVELS), dtype=np.int64)
+        self.segment_counts = np.zeros(n_clusters, dtype=np.int64)
+        # Per-cluster sums of recency, frequency and monetary
+        self.segment_sums = np.zeros((n_clusters, 3), dtype=np.float64)
+        self.top_probabilities = np.empty(0, dtype=np.float64)
+        self.top_customers = np.empty(0, dtype=np.int64)
+        self.rfm_quantiles = RFMQuantiles()
+
+    def add_churn(self, customer_codes, probabilities, risk_codes):
+        self.n_customers += len(probabilities)
+        self.churn_probability_sum += float(probabilities.sum())
+        self.risk_counts += np.bincount(risk_codes, minlength=len(RISK_LEVELS))
+        self._keep_top(customer_codes, probabilities)
+
+    def add_segments(self, clusters, rfm):
+        rfm_values = rfm[['recency', 'frequency', 'monetary']].to_numpy(dtype=np.float64)
+        self.rfm_quantiles.update(rfm)
+        self.segment_counts += np.bincount(clusters, minlength=self.n_clusters)
+        for j in range(rfm_values.shape[1]):
+            self.segment_sums[:, j] += np.bincount(clusters, weights=rfm_values[:, j], minlength=self.n_clusters)
+
+    def _keep_top(self, customer_codes, probabilities):
+        codes = np.concatenate([self.top_customers, customer_codes])
+        probs = np.concatenate([self.top_probabilities, probabilities])
+        if len(probs) > self.top_k:
+            keep = np.argpartition(-probs, self.top_k - 1)[:self.top_k]
+            codes, probs = codes[keep], probs[keep]
+        order = np.argsort(-probs, kind='stable')
+        self.top_customers, self.top_probabilities = codes[order], probs[order]
+
+    def merge(self, other):
+        """Fold another summary into this one"""
+        self.n_customers += other.n_customers
+        self.churn_probability_sum += other.churn_probability_sum
+        self.risk_counts += other.risk_counts
+        self.segment_counts += other.segment_counts
+        self.segment_sums += other.segment_sums
+        self._keep_top(other.top_customers, other.top_probabilities)
+        self.rfm_quantiles.merge(other.rfm_quantiles)
+        return self
+
+    @property
+    def churn_rate(self):
+        return self.churn_probability_sum / self.n_customers if self.n_customers else 0.0
+
+    def segment_means(self):
+        counts = np.maximum(self.segment_counts, 1)[:, np.newaxis]
+        return self.segment_sums / counts
+
+
+def _score_shard(shm_name, layout, bounds, gender_categories, reference_date,
+                 churn_predictor, customer_segmentation, top_k):
+    """Worker entry point: score one shard straight from shared memory"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        arrays = SharedArrays.attach(shm, layout)
+        c_start, c_end, o_start, o_end = bounds
+
+        customers = pd.DataFrame({col: arrays[col][c_start:c_end] for col in CUSTOMER_SHARD_COLUMNS})
+        customers['gender'] = pd.Categorical.from_codes(arrays['gender'][c_start:c_end], gender_categories)
+        orders = pd.DataFrame({col: arrays[f'order_{col}'][o_start:o_end] for col in ORDER_SHARD_COLUMNS})
+
+        summary = AnalyticsSummary(customer_segmentation.n_clusters, top_k)
+
+        features = churn_predictor.prepare_features(customers)
+        probabilities = churn_predictor.predict_proba(features)
+        summary.add_churn(customers['customer_id'].to_numpy(), probabilities, churn_predictor.risk_level_codes(probabilities))
+
+        if len(orders):
+            # Quintile scores need global boundaries, which come from the merged shard sketches
+            rfm = customer_segmentation.create_rfm_features(orders, current_date=reference_date, scores=False)
+            clusters = customer_segmentation.assign_clusters(rfm)
+            summary.add_segments(clusters, rfm)
+
+        # Drop every view into the block before the mapping is closed
+        del arrays, customers, orders, features
+        return summary
+    finally:
+        shm.close()
+
+
+class ShardedAnalytics:
+    """Runs per-customer churn scoring and segmentation over hash-partitioned shards in a process pool"""
+
+    def __init__(self, n_shards=None, top_k=50):
+        self.n_shards = n_shards or os.cpu_count() or 1
+        self.top_k = top_k
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            # spawn avoids forking the threads of a running server
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.n_shards,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _partition(self, customer_data, sales_data):
+        """Sort customers and orders by shard and return the packed arrays plus shard bounds"""
+        customer_shards = shard_of(customer_data['customer_id'].to_numpy(), self.n_shards)
+        customer_order = np.argsort(customer_shards, kind='stable')
+
+        # Orders follow their customer's shard; customer codes index the shard lookup directly
+        lookup = np.zeros(int(customer_data['customer_id'].max()) + 1, dtype=np.int64)
+        lookup[customer_data['customer_id'].to_numpy()] = customer_shards
+        order_shards = lookup[sales_data['customer_id'].to_numpy()]
+        order_order = np.argsort(order_shards, kind='stable')
+
+        gender = customer_data['gender'].astype('category')
+        arrays = {col: customer_data[col].to_numpy()[customer_order] for col in CUSTOMER_SHARD_COLUMNS}
+        arrays['gender'] = gender.cat.codes.to_numpy()[customer_order]
+        for col in ORDER_SHARD_COLUMNS:
+            arrays[f'order_{col}'] = sales_data[col].to_numpy()[order_order]
+
+        customer_bounds = np.searchsorted(customer_shards[customer_order], np.arange(self.n_shards + 1))
+        order_bounds = np.searchsorted(order_shards[order_order], np.arange(self.n_shards + 1))
+        bounds = [
+            (customer_bounds[k], customer_bounds[k + 1], order_bounds[k], order_bounds[k + 1])
+            for k in range(self.n_shards)
+        ]
+        return arrays, bounds, list(gender.cat.categories)
+
+    def run(self, customer_data, sales_data, churn_predictor, customer_segmentation):
+        """Score every customer across shards and return the merged summary"""
+        arrays, bounds, gender_categories = self._partition(customer_data, sales_data)
+        reference_date = sales_data['order_date'].max()
+        shared = SharedArrays(arrays)
+        del arrays
+
+        try:
+            pool = self._get_pool()
+            futures = [
+                pool.submit(
+                    _score_shard, shared.name, shared.layout, shard_bounds, gender_categories,
+                    reference_date, churn_predictor, customer_segmentation, self.top_k
+                )
+                for shard_bounds in bounds
+            ]
+            summary = AnalyticsSummary(customer_segmentation.n_clusters, self.top_k)
+            try:
+                for future in futures:
+                    check_deadline()
+                    summary.merge(future.result())
+            except DeadlineExceeded:
+                # Shards no worker has picked up yet are dropped; running ones finish unobserved
+                for future in futures:
+                    future.cancel()
+                raise
+        finally:
+            shared.close()
+
+        logger.info(f"Sharded analytics scored {summary.n_customers} customers over {self.n_shards} shards")
+        return summary
@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import os
+import re
+from collections import OrderedDict
+from datetime import datetime
+from app.services.analytics_service import AnalyticsService
+from app.services.data_service import DataService
+from app.services.ingestion_service import IngestionService
+from app.services.dashboard_publisher import DashboardPublisher
+from app.services.scoring_service import ScoringScheduler
+from app.services.response_cache import ResponseCache
+from app.services.export_service import ExportService
+from app.services.sharded_analytics import ShardedAnalytics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TENANT = 'default'
+# Tenant IDs name snapshot files, so they are limited to a path-safe alphabet
+TENANT_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class UnknownTenantError(KeyError):
+    """Raised when a request names a tenant that is neither configured nor created by ingestion"""
+
+
+class TenantUsage:
+    """Per-tenant usage counters, kept across evictions so placement can use a tenant's history"""
+
+    def __init__(self):
+        self.requests = 0
+        self.busy_seconds = 0.0
+        self.loads = 0
+        self.spills = 0
+        self.evictions = 0
+        self.last_access = None
+        self.memory_bytes = 0
+
+    def to_dict(self):
+        return {
+            'requests': self.requests,
+            'busy_seconds': round(self.busy_seconds, 3),
+            'loads': self.loads,
+            'spills': self.spills,
+            'evictions': self.evictions,
+            'last_access': self.last_access.isoformat() if self.last_access else None,
+            'memory_bytes': self.memory_bytes
+        }
+
+
+class Tenant:
+    """One tenant's data store and models, plus the services that serve them"""
+
+    def __init__(self, tenant_id, data_service, sharded_analytics, scoring_interval=300.0):
+        self.tenant_id = tenant_id
+        self.data_service = data_service
+        self.analytics_service = AnalyticsService(data_service, sharded_analytics)
+        self.ingestion_service = IngestionService(data_service)
+        self.dashboard_publisher = DashboardPublisher(self.analytics_service)
+        self.response_cache = ResponseCache(namespace=tenant_id)
+        self.export_service = ExportService(data_service)
+        self.scoring_scheduler = ScoringScheduler(self.analytics_service, interval=scoring_interval)
+        # Data version already on disk; None when the tenant has never been spilled
+        self.snapshot_version = None
+        self.active_requests = 0
+
+    @property
+    def nbytes(self):
+        """Stored data, indexes and derived tables; fitted models and the sentiment score cache are not counted"""
+        table = self.analytics_service.scoring_table
+        return (self.data_service.nbytes + (table.nbytes if table is not None else 0)
+                + self.analytics_service.sentiment_aggregates.nbytes + self.response_cache.nbytes)
+
+    @property
+    def dirty(self):
+        return self.snapshot_version != self.data_service.data_version
+
+    @property
+    def pinned(self):
+        # In-flight requests and open dashboard streams hold references to these services
+        return self.active_requests > 0 or self.dashboard_publisher.subscriber_count > 0
+
+
+class TenantRegistry:
+    """Per-tenant services, loaded on first use and spilled least-recently-used under a memory budget.
+
+    Evicted tenants are written to columnar .npz snapshots and restored from
+    them on their next request; their models are refitted lazily on first use.
+    The budget covers each tenant's tables, indexes, scoring table, sentiment
+    aggregates and cached response bodies. Fitted models and the per-tenant
+    sentiment score cache (bounded by its capacity) come on top of it.
+    Only configured tenants and tenants with a snapshot exist; any other ID is
+    created explicitly (by ingestion) rather than by being named in a request.
+    """
+
+    def __init__(self, snapshot_dir, memory_budget, scoring_interval=300.0, sample_tenants=(DEFAULT_TENANT,),
+                 tenants=()):
+        self.snapshot_dir = snapshot_dir
+        self.memory_budget = memory_budget
+        self.scoring_interval = scoring_interval
+        self.sample_tenants = set(sample_tenants)
+        self.configured_tenants = set(tenants) | self.sample_tenants
+        self.tenants = OrderedDict()
+        self.usage = {}
+        self.sharded_analytics = ShardedAnalytics(n_shards=int(os.getenv('ANALYTICS_SHARDS', '0')) or None)
+        self._locks = {}
+        self._started = False
+
+    def snapshot_path(self, tenant_id):
+        return os.path.join(self.snapshot_dir, f'{tenant_id}.npz')
+
+    def _lock(self, tenant_id):
+        if tenant_id not in self._locks:
+            self._locks[tenant_id] = asyncio.Lock()
+        return self._locks[tenant_id]
+
+    def exists(self, tenant_id):
+        return (tenant_id in self.tenants or tenant_id in self.configured_tenants
+                or os.path.exists(self.snapshot_path(tenant_id)))
+
+    async def acquire(self, tenant_id, create=False):
+        """Resident tenant for a request, loading it first if needed; pair with release().
+
+        Unknown tenants raise UnknownTenantError unless create is set.
+        """
+        if not TENANT_ID_PATTERN.match(tenant_id or ''):
+            raise ValueError("Tenant IDs are 1-64 letters, digits, '-' or '_'")
+
+        tenant = self.tenants.get(tenant_id)
+        if tenant is None:
+            # Checked before a lock or usage entry exists, so unknown IDs leave no trace
+            if not create and not self.exists(tenant_id):
+                raise UnknownTenantError(tenant_id)
+            async with self._lock(tenant_id):
+                tenant = self.tenants.get(tenant_id)
+                if tenant is None:
+                    tenant = await asyncio.to_thread(self._load, tenant_id)
+                    self.tenants[tenant_id] = tenant
+                    if self._started:
+                        tenant.scoring_scheduler.start()
+
+        tenant.active_requests += 1
+        self.tenants.move_to_end(tenant_id)
+        usage = self.usage.setdefault(tenant_id, TenantUsage())
+        usage.requests += 1
+        usage.last_access = datetime.now()
+        await self.enforce_budget()
+        return tenant
+
+    def release(self, tenant, busy_seconds):
+        tenant.active_requests -= 1
+        self.usage[tenant.tenant_id].busy_seconds += busy_seconds
+
+    def _load(self, tenant_id):
+        path = self.snapshot_path(tenant_id)
+        if os.path.exists(path):
+            data_service = DataService.load_snapshot(path)
+            snapshot_version = data_service.data_version
+            logger.info(f"Restored tenant '{tenant_id}' from {path}")
+        else:
+            data_service = DataService(sample_data=tenant_id in self.sample_tenants)
+            snapshot_version = None
+            logger.info(f"Created tenant '{tenant_id}'")
+
+        tenant = Tenant(tenant_id, data_service, self.sharded_analytics, self.scoring_interval)
+        tenant.snapshot_version = snapshot_version
+        self.usage.setdefault(tenant_id, TenantUsage()).loads += 1
+        return tenant
+
+    async def enforce_budget(self):
+        """Spill idle tenants, least recently used first, until the resident ones fit the budget"""
+        sizes = {tenant_id: tenant.nbytes for tenant_id, tenant in self.tenants.items()}
+        for tenant_id, size in sizes.items():
+            self.usage[tenant_id].memory_bytes = size
+        resident = sum(sizes.values())
+
+        for tenant_id in sizes:
+            if resident <= self.memory_budget:
+                break
+            if await self.evict(tenant_id):
+                resident -= sizes[tenant_id]
+
+    async def evict(self, tenant_id):
+        """Spill a tenant to its snapshot and drop it from memory, unless it is in use"""
+        async with self._lock(tenant_id):
+            tenant = self.tenants.get(tenant_id)
+            if tenant is None or tenant.pinned:
+                return False
+            del self.tenants[tenant_id]
+            await tenant.scoring_scheduler.stop()
+            # Holding the lock while writing makes a concurrent reload wait for the fresh snapshot
+            if tenant.dirty:
+                await asyncio.to_thread(self._spill, tenant)
+            self.usage[tenant_id].evictions += 1
+            logger.info(f"Evicted tenant '{tenant_id}' ({self.usage[tenant_id].memory_bytes} bytes)")
+            return True
+
+    def _spill(self, tenant):
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        tenant.data_service.save_snapshot(self.snapshot_path(tenant.tenant_id))
+        tenant.snapshot_version = tenant.data_service.data_version
+        self.usage[tenant.tenant_id].spills += 1
+
+    def start(self):
+        self._started = True
+        for tenant in self.tenants.values():
+            tenant.scoring_scheduler.start()
+
+    async def shutdown(self):
+        """Stop background work and persist every tenant with unsaved data"""
+        self._started = False
+        for tenant in list(self.tenants.values()):
+            await tenant.scoring_scheduler.stop()
+            if tenant.dirty:
+                await asyncio.to_thread(self._spill, tenant)
+        self.sharded_analytics.shutdown()
+
+    def stats(self):
+        """Memory use against the budget, and usage per known tenant"""
+        spilled = set()
+        if os.path.isdir(self.snapshot_dir):
+            spilled = {name[:-4] for name in os.listdir(self.snapshot_dir) if name.endswith('.npz')}
+
+        tenants = {}
+        for tenant_id in sorted(set(self.usage) | spilled):
+            usage = self.usage.get(tenant_id, TenantUsage())
+            tenant = self.tenants.get(tenant_id)
+            entry = {'resident': tenant is not None, 'has_snapshot': tenant_id in spilled, **usage.to_dict()}
+            if tenant is not None:
+                entry.update(memory_bytes=tenant.nbytes, data_version=tenant.data_service.data_version,
+                             **tenant.data_service.row_counts())
+            tenants[tenant_id] = entry
+
+        return {
+            'memory_budget_bytes': self.memory_budget,
+            'resident_bytes': sum(tenant.nbytes for tenant in self.tenants.values()),
+            'resident_tenants': list(self.tenants),
+            'tenants': tenants
+        }
@@ -0,0 +1,79 @@
+import numpy as np
+
+
+class DailyIndex:
+    """Per-day revenue/order totals with prefix sums.
+
+    Window totals are two prefix lookups; locating a date is a binary search
+    over the day axis. Distinct customers are not kept here: they come from the
+    DistinctCountCube, so windowed and filtered counts share one set of sketches.
+    """
+
+    def __init__(self):
+        self.origin = None
+        self.days = np.empty(0, dtype='datetime64[D]')
+        self._revenue = np.zeros(0, dtype=np.float64)
+        self._orders = np.zeros(0, dtype=np.int64)
+        self._prefix = None
+
+    @property
+    def nbytes(self):
+        return self._revenue.nbytes + self._orders.nbytes
+
+    def _ensure_range(self, first_day, last_day):
+        """Grow the day axis to cover [first_day, last_day]"""
+        if self.origin is None:
+            self.origin = first_day
+        start = min(self.origin, first_day)
+        end = max(self.origin + len(self.days) - 1, last_day) if len(self.days) else last_day
+        before = int((self.origin - start).astype(np.int64))
+        after = int((end - start).astype(np.int64)) + 1 - before - len(self.days)
+        if before or after:
+            self._revenue = np.pad(self._revenue, (before, after))
+            self._orders = np.pad(self._orders, (before, after))
+            self.origin = start
+            self.days = start + np.arange(len(self._revenue))
+
+    def add_orders(self, order_dates, amounts):
+        """Fold a batch of orders into the per-day totals"""
+        days = np.asarray(order_dates).astype('datetime64[D]')
+        if len(days) == 0:
+            return
+        self._ensure_range(days.min(), days.max())
+        day_idx = (days - self.origin).astype(np.int64)
+
+        n_days = len(self.days)
+        self._revenue += np.bincount(day_idx, weights=np.asarray(amounts, dtype=np.float64), minlength=n_days)
+        self._orders += np.bincount(day_idx, minlength=n_days)
+        self._prefix = None
+
+    def _prefixes(self):
+        # Rebuilt lazily after writes: O(days) once, then every query is a lookup
+        if self._prefix is None:
+            self._prefix = {
+                'revenue': np.concatenate([[0.0], np.cumsum(self._revenue)]),
+                'orders': np.concatenate([[0], np.cumsum(self._orders)])
+            }
+        return self._prefix
+
+    def _bounds(self, start=None, end=None):
+        """Half-open day-index range covering the inclusive [start, end] dates"""
+        lo = 0 if start is None else int(np.searchsorted(self.days, np.datetime64(start, 'D'), side='left'))
+        hi = len(self.days) if end is None else int(np.searchsorted(self.days, np.datetime64(end, 'D'), side='right'))
+        return lo, max(lo, hi)
+
+    def window(self, start=None, end=None):
+        """Revenue and orders for the inclusive [start, end] day window"""
+        prefix = self._prefixes()
+        lo, hi = self._bounds(start, end)
+        return {
+            'start': str(self.days[lo]) if hi > lo else None,
+            'end': str(self.days[hi - 1]) if hi > lo else None,
+            'revenue': float(prefix['revenue'][hi] - prefix['revenue'][lo]),
+            'orders': int(prefix['orders'][hi] - prefix['orders'][lo])
+        }
+
+    def daily_totals(self):
+        """Days that had orders, with their revenue"""
+        has_orders = self._orders > 0
+        return self.days[has_orders], self._revenue[has_orders]
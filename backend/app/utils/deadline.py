@@ -0,0 +1,105 @@
+import asyncio
+import contextvars
+import threading
+import time
+
+
+class DeadlineExceeded(Exception):
+    """Raised at a checkpoint once a request has run out of time or lost its client"""
+
+
+class RequestBudget:
+    """Wall-clock deadline of one request, plus a cancellation flag visible from worker threads"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.deadline = time.monotonic() + seconds
+        self.reason = None
+        self._cancelled = threading.Event()
+        # Worker-thread futures still running for this request, and what waits for them to finish
+        self._workers = set()
+        self._idle_callbacks = []
+
+    def remaining(self):
+        return max(0.0, self.deadline - time.monotonic())
+
+    @property
+    def expired(self):
+        return self._cancelled.is_set() or time.monotonic() >= self.deadline
+
+    def cancel(self, reason):
+        self.reason = reason
+        self._cancelled.set()
+
+    def check(self):
+        if self._cancelled.is_set():
+            raise DeadlineExceeded(self.reason)
+        if time.monotonic() >= self.deadline:
+            raise DeadlineExceeded(f"Deadline of {self.seconds:g}s exceeded")
+
+    @property
+    def running_workers(self):
+        return len(self._workers)
+
+    def track(self, future):
+        self._workers.add(future)
+        future.add_done_callback(self._worker_done)
+
+    def _worker_done(self, future):
+        self._workers.discard(future)
+        if not future.cancelled():
+            # Retrieved here too: an abandoned request no longer awaits its workers
+            future.exception()
+        if not self._workers:
+            callbacks, self._idle_callbacks = self._idle_callbacks, []
+            for callback in callbacks:
+                callback()
+
+    def when_idle(self, callback):
+        """Run callback now, or on the event loop once this request's worker threads have all returned"""
+        if self._workers:
+            self._idle_callbacks.append(callback)
+        else:
+            callback()
+
+
+# Context variables follow asyncio tasks and asyncio.to_thread, so the budget
+# set by the request handler reaches analytics code without extra parameters
+_current_budget = contextvars.ContextVar('request_budget', default=None)
+
+
+def set_budget(budget):
+    return _current_budget.set(budget)
+
+
+def reset_budget(token):
+    _current_budget.reset(token)
+
+
+def deadline_active():
+    return _current_budget.get() is not None
+
+
+def current_budget():
+    return _current_budget.get()
+
+
+async def to_thread(func, *args, **kwargs):
+    """asyncio.to_thread whose thread stays accounted to the request even after the request is cancelled.
+
+    A thread cannot be interrupted, so cancelling the awaiting task only
+    abandons it; the shielded future lets the budget see when it really ends.
+    """
+    budget = _current_budget.get()
+    if budget is None:
+        return await asyncio.to_thread(func, *args, **kwargs)
+    future = asyncio.ensure_future(asyncio.to_thread(func, *args, **kwargs))
+    budget.track(future)
+    return await asyncio.shield(future)
+
+
+def check_deadline():
+    """Abandon work whose request has expired or been cancelled; a no-op outside a request"""
+    budget = _current_budget.get()
+    if budget is not None:
+        budget.check()
@@ -0,0 +1,143 @@
+import numpy as np
+
+# Population stability index above which a feature's distribution counts as shifted
+PSI_THRESHOLD = 0.2
+# Mean shift, in reference standard deviations, above which a feature counts as shifted
+MEAN_SHIFT_THRESHOLD = 0.5
+# Fewer live rows than this are too noisy to call drift on
+MIN_OBSERVATIONS = 30
+# Floor on bin proportions so empty bins do not make the PSI infinite
+_PSI_FLOOR = 1e-4
+
+
+class DriftMonitor:
+    """Running moments and fixed-edge histograms of a model's input features.
+
+    Bin edges are laid out around the reference mean and standard deviation a
+    model was trained with, so a monitor fed with training rows and one fed with
+    live rows count into the same bins and can be compared bin by bin. Moments
+    are combined batch by batch (Chan et al.), so neither monitor keeps rows;
+    rows can also be removed again, so a monitor can track mutable records.
+    """
+
+    def __init__(self, mean, std, n_bins=10, span=3.0):
+        self.feature_names = list(mean)
+        self.reference_mean = np.array([mean[f] for f in self.feature_names], dtype=np.float64)
+        self.reference_std = np.array([std[f] for f in self.feature_names], dtype=np.float64)
+        self.reference_std[~(self.reference_std > 0)] = 1.0
+        self.n_bins = n_bins
+        self.span = span
+        # Interior edges only: the outermost bins are open-ended tails
+        z = np.linspace(-span, span, n_bins - 1)
+        self.edges = self.reference_mean[:, np.newaxis] + self.reference_std[:, np.newaxis] * z
+
+        self.count = 0
+        self.mean = np.zeros(len(self.feature_names))
+        self.m2 = np.zeros(len(self.feature_names))
+        self.counts = np.zeros((len(self.feature_names), n_bins), dtype=np.int64)
+
+    def spawn(self):
+        """Empty monitor with the same reference and bin edges"""
+        return DriftMonitor(dict(zip(self.feature_names, self.reference_mean)),
+                            dict(zip(self.feature_names, self.reference_std)), self.n_bins, self.span)
+
+    def copy(self):
+        return self.spawn().merge(self)
+
+    def clear(self):
+        self.count = 0
+        self.mean = np.zeros(len(self.feature_names))
+        self.m2 = np.zeros(len(self.feature_names))
+        self.counts[:] = 0
+        return self
+
+    def _rows(self, frame):
+        X = frame[self.feature_names].to_numpy(dtype=np.float64)
+        return X[np.isfinite(X).all(axis=1)]
+
+    def _histogram(self, X):
+        return np.stack([
+            np.bincount(np.searchsorted(self.edges[j], X[:, j], side='right'), minlength=self.n_bins)
+            for j in range(len(self.feature_names))
+        ])
+
+    def update(self, frame):
+        """Fold a batch of feature rows into the running moments and histograms"""
+        X = self._rows(frame)
+        if len(X) == 0:
+            return self
+
+        batch_mean = X.mean(axis=0)
+        batch_m2 = ((X - batch_mean) ** 2).sum(axis=0)
+        self._combine(len(X), batch_mean, batch_m2)
+        self.counts += self._histogram(X)
+        return self
+
+    def remove(self, frame):
+        """Take rows folded in earlier back out, so a row whose features changed can be replaced"""
+        X = self._rows(frame)
+        if len(X) == 0:
+            return self
+        remaining = self.count - len(X)
+        if remaining <= 0:
+            return self.clear()
+
+        # Chan's merge run backwards: recover the moments of the rows that stay
+        batch_mean = X.mean(axis=0)
+        batch_m2 = ((X - batch_mean) ** 2).sum(axis=0)
+        mean = (self.count * self.mean - len(X) * batch_mean) / remaining
+        delta = batch_mean - mean
+        self.m2 = np.maximum(self.m2 - batch_m2 - delta ** 2 * remaining * len(X) / self.count, 0.0)
+        self.mean = mean
+        self.count = remaining
+        self.counts -= self._histogram(X)
+        return self
+
+    def merge(self, other):
+        """Fold another monitor with the same edges into this one"""
+        if other.count:
+            self._combine(other.count, other.mean, other.m2)
+            self.counts += other.counts
+        return self
+
+    def _combine(self, n, mean, m2):
+        total = self.count + n
+        delta = mean - self.mean
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * n / total
+        self.mean = self.mean + delta * n / total
+        self.count = total
+
+    @property
+    def std(self):
+        return np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.zeros(len(self.feature_names))
+
+    def compare(self, reference, psi_threshold=PSI_THRESHOLD, shift_threshold=MEAN_SHIFT_THRESHOLD,
+                min_observations=MIN_OBSERVATIONS):
+        """Per-feature mean shift, spread ratio and PSI of this monitor against a reference monitor"""
+        if self.count == 0 or reference.count == 0:
+            return {'observations': int(self.count), 'reference_observations': int(reference.count),
+                    'drifted': False, 'drifted_features': [], 'features': {}}
+
+        observed = np.maximum(self.counts / self.count, _PSI_FLOOR)
+        expected = np.maximum(reference.counts / reference.count, _PSI_FLOOR)
+        psi = np.sum((observed - expected) * np.log(observed / expected), axis=1)
+        mean_shift = (self.mean - self.reference_mean) / self.reference_std
+        std_ratio = self.std / self.reference_std
+        drifted = ((psi > psi_threshold) | (np.abs(mean_shift) > shift_threshold)) & (self.count >= min_observations)
+
+        return {
+            'observations': int(self.count),
+            'reference_observations': int(reference.count),
+            'drifted': bool(drifted.any()),
+            'drifted_features': [f for f, d in zip(self.feature_names, drifted) if d],
+            'features': {
+                feature: {
+                    'mean': round(float(self.mean[j]), 4),
+                    'reference_mean': round(float(self.reference_mean[j]), 4),
+                    'mean_shift': round(float(mean_shift[j]), 4),
+                    'std_ratio': round(float(std_ratio[j]), 4),
+                    'psi': round(float(psi[j]), 4)
+                }
+                for j, feature in enumerate(self.feature_names)
+            }
+        }
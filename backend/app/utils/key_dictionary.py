@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+
+class KeyDictionary:
+    """Maps string keys to dense integer codes, decoding back to strings only on demand"""
+
+    def __init__(self, keys=None):
+        self._codes = {}
+        self._keys = []
+        self._decoded = None
+        if keys is not None:
+            self.encode(keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._codes
+
+    def lookup(self, key):
+        """Code for a single key, or -1 when unknown"""
+        return self._codes.get(key, -1)
+
+    def encode(self, keys, add=True):
+        """Encode keys to int64 codes, assigning new codes in first-seen order when add is set"""
+        # factorize lists uniques in first-seen order, so new codes follow arrival order
+        local_codes, uniques = pd.factorize(np.asarray(keys, dtype=object))
+        if len(uniques) == 0:
+            return np.full(len(local_codes), -1, dtype=np.int64)
+        unique_codes = np.empty(len(uniques), dtype=np.int64)
+        codes_map = self._codes
+
+        for i, key in enumerate(uniques):
+            code = codes_map.get(key, -1)
+            if code < 0 and add:
+                code = len(self._keys)
+                codes_map[key] = code
+                self._keys.append(key)
+                self._decoded = None
+            unique_codes[i] = code
+
+        # Missing keys factorize to -1 and stay -1
+        return np.where(local_codes >= 0, unique_codes[local_codes], -1)
+
+    def decode(self, codes):
+        """Decode integer codes back to their string keys (-1 decodes to None)"""
+        if self._decoded is None or len(self._decoded) != len(self._keys) + 1:
+            # Trailing None makes code -1 decode to a missing value
+            self._decoded = np.array(self._keys + [None], dtype=object)
+        return self._decoded[np.asarray(codes, dtype=np.int64)]
@@ -0,0 +1,150 @@
+import numpy as np
+
+SENTIMENTS = ['positive', 'negative', 'neutral']
+SENTIMENT_CODES = {sentiment: code for code, sentiment in enumerate(SENTIMENTS)}
+
+# Weeks start on Monday; 1970-01-05 is the first Monday of the epoch
+WEEK_ORIGIN = np.datetime64('1970-01-05', 'D')
+_WEEK_MASK = np.int64(0xFFFFFFFF)
+# Stored week numbers are offset by 2**31 so weeks before 1970 stay in the key's low 32 bits
+_WEEK_BIAS = np.int64(1 << 31)
+
+
+def week_index(dates):
+    """Monday-based week numbers for datetime values"""
+    days = np.asarray(dates).astype('datetime64[D]')
+    return (days - WEEK_ORIGIN).astype(np.int64) // 7
+
+
+def week_start(weeks):
+    return WEEK_ORIGIN + np.asarray(weeks, dtype=np.int64) * 7
+
+
+class SentimentAggregates:
+    """Review counts per sentiment and rating sums per product x week, stored sparsely.
+
+    Only non-empty (product, week) cells are kept, under product-major int64 keys
+    (product << 32 | biased week) held in sorted order, so one product's weeks
+    form a contiguous run found by binary search. Batches are buffered on add and
+    merged into the sorted arrays on the next query. Not thread-safe: callers
+    serialize adds and queries, since a query compacts the buffered batches.
+    """
+
+    def __init__(self):
+        self.keys = np.empty(0, dtype=np.int64)
+        self.counts = np.zeros((0, len(SENTIMENTS)), dtype=np.int64)
+        self.rating_sums = np.zeros(0, dtype=np.float64)
+        self._pending = []
+        self._product_totals = None
+
+    def __len__(self):
+        self._compact()
+        return len(self.keys)
+
+    @property
+    def nbytes(self):
+        return self.keys.nbytes + self.counts.nbytes + self.rating_sums.nbytes
+
+    def add(self, product_codes, review_dates, sentiments, ratings):
+        """Buffer a batch of scored reviews; sentiments are labels from SENTIMENTS"""
+        if len(product_codes) == 0:
+            return
+        keys = (np.asarray(product_codes, dtype=np.int64) << 32) | (week_index(review_dates) + _WEEK_BIAS)
+        codes = np.array([SENTIMENT_CODES[s] for s in sentiments], dtype=np.int64)
+        self._pending.append((keys, codes, np.asarray(ratings, dtype=np.float64)))
+
+    def _compact(self):
+        if not self._pending:
+            return
+        new_keys, new_codes, new_ratings = (np.concatenate(parts) for parts in zip(*self._pending))
+        self._pending = []
+
+        keys, inverse = np.unique(np.concatenate([self.keys, new_keys]), return_inverse=True)
+        old_rows, new_rows = inverse[:len(self.keys)], inverse[len(self.keys):]
+        counts = np.zeros((len(keys), len(SENTIMENTS)), dtype=np.int64)
+        counts[old_rows] = self.counts
+        np.add.at(counts, (new_rows, new_codes), 1)
+        rating_sums = np.zeros(len(keys), dtype=np.float64)
+        rating_sums[old_rows] = self.rating_sums
+        rating_sums += np.bincount(new_rows, weights=new_ratings, minlength=len(keys))
+
+        self.keys, self.counts, self.rating_sums = keys, counts, rating_sums
+        self._product_totals = None
+
+    @staticmethod
+    def _weeks(keys):
+        return (keys & _WEEK_MASK) - _WEEK_BIAS
+
+    @staticmethod
+    def _in_window(keys, start=None, end=None):
+        """Mask of cells whose week overlaps the inclusive [start, end] date window"""
+        weeks = SentimentAggregates._weeks(keys)
+        mask = np.ones(len(keys), dtype=bool)
+        if start is not None:
+            mask &= weeks >= week_index(np.datetime64(start, 'D'))
+        if end is not None:
+            mask &= weeks <= week_index(np.datetime64(end, 'D'))
+        return mask
+
+    def _per_product(self, mask=None):
+        keys, counts, ratings = self.keys, self.counts, self.rating_sums
+        if mask is not None:
+            keys, counts, ratings = keys[mask], counts[mask], ratings[mask]
+        if len(keys) == 0:
+            return np.empty(0, dtype=np.int64), counts, ratings
+        # Keys are sorted product-major, so each product is one run
+        products, starts = np.unique(keys >> 32, return_index=True)
+        return products, np.add.reduceat(counts, starts, axis=0), np.add.reduceat(ratings, starts)
+
+    def worst_products(self, n=10, min_reviews=1, start=None, end=None):
+        """Products with the highest share of negative reviews, most negative reviews first on ties"""
+        self._compact()
+        if start is None and end is None:
+            if self._product_totals is None:
+                self._product_totals = self._per_product()
+            products, counts, ratings = self._product_totals
+        else:
+            products, counts, ratings = self._per_product(self._in_window(self.keys, start, end))
+
+        totals = counts.sum(axis=1)
+        eligible = np.flatnonzero(totals >= max(min_reviews, 1))
+        negative_share = counts[eligible, SENTIMENT_CODES['negative']] / totals[eligible]
+        order = np.lexsort((-counts[eligible, SENTIMENT_CODES['negative']], -negative_share))[:n]
+        rows = eligible[order]
+
+        return [
+            {
+                'product_code': int(products[row]),
+                'reviews': int(totals[row]),
+                **{sentiment: int(counts[row, code]) for code, sentiment in enumerate(SENTIMENTS)},
+                'negative_share': round(float(share), 4),
+                'avg_rating': round(float(ratings[row] / totals[row]), 2)
+            }
+            for row, share in zip(rows, negative_share[order])
+        ]
+
+    def trend(self, product_code=None, start=None, end=None):
+        """Weekly sentiment counts for one product, or across all products"""
+        self._compact()
+        if product_code is not None:
+            lo, hi = np.searchsorted(self.keys, [product_code << 32, (product_code + 1) << 32])
+            rows = np.arange(lo, hi)
+        else:
+            rows = np.arange(len(self.keys))
+        rows = rows[self._in_window(self.keys[rows], start, end)]
+
+        weeks, inverse = np.unique(self._weeks(self.keys[rows]), return_inverse=True)
+        counts = np.zeros((len(weeks), len(SENTIMENTS)), dtype=np.int64)
+        np.add.at(counts, inverse, self.counts[rows])
+        ratings = np.bincount(inverse, weights=self.rating_sums[rows], minlength=len(weeks))
+        totals = counts.sum(axis=1)
+
+        return [
+            {
+                'week_start': str(day),
+                'reviews': int(total),
+                **{sentiment: int(count) for sentiment, count in zip(SENTIMENTS, row)},
+                'avg_rating': round(float(rating / total), 2)
+            }
+            for day, total, row, rating in zip(week_start(weeks), totals, counts, ratings)
+        ]
@@ -0,0 +1,270 @@
+import numpy as np
+from app.utils.key_dictionary import KeyDictionary
+
+
+def splitmix64(values):
+    """Vectorized splitmix64 finalizer: well-mixed 64-bit hashes of integer keys"""
+    x = np.asarray(values).astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _bit_length(x):
+    """Exact bit length of uint64 values"""
+    x = x.copy()
+    n = np.zeros(len(x), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = x >= (np.uint64(1) << np.uint64(shift))
+        n[high] += shift
+        x[high] >>= np.uint64(shift)
+    return n + (x > 0)
+
+
+def hll_positions(hashes, precision):
+    """Register index and rank (leading-zero count + 1) for each 64-bit hash"""
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    suffix_bits = 64 - precision
+    index = (hashes >> np.uint64(suffix_bits)).astype(np.int64)
+    suffix = hashes & np.uint64((1 << suffix_bits) - 1)
+    rank = (suffix_bits - _bit_length(suffix) + 1).astype(np.uint8)
+    return index, rank
+
+
+def hll_update(registers, cells, rank):
+    """Max-fold ranks into a flat register array, one write per touched cell"""
+    order = np.lexsort((rank, cells))
+    cells, rank = cells[order], rank[order]
+    # After sorting by (cell, rank) the last entry of each cell holds its maximum
+    last = np.r_[cells[1:] != cells[:-1], True]
+    cells, rank = cells[last], rank[last]
+    registers[cells] = np.maximum(registers[cells], rank)
+
+
+def hll_estimate(registers):
+    """Cardinality estimate from a (..., m) register array, reduced over the last axis"""
+    registers = np.asarray(registers)
+    m = registers.shape[-1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.sum(np.exp2(-registers.astype(np.float64)), axis=-1)
+    zeros = np.sum(registers == 0, axis=-1)
+    # Linear counting is more accurate while many registers are still empty
+    small = (raw <= 2.5 * m) & (zeros > 0)
+    linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where(small, linear, raw)
+
+
+class HyperLogLog:
+    """Mergeable HyperLogLog distinct-count sketch"""
+
+    def __init__(self, precision=12, registers=None):
+        self.precision = precision
+        self.registers = registers if registers is not None else np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        index, rank = hll_positions(hashes, self.precision)
+        hll_update(self.registers, index, rank)
+        return self
+
+    def add(self, keys):
+        return self.add_hashes(splitmix64(keys))
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        return float(hll_estimate(self.registers))
+
+    @property
+    def relative_error(self):
+        return 1.04 / np.sqrt(1 << self.precision)
+
+
+class KLLSketch:
+    """Mergeable KLL quantile sketch over float values.
+
+    Level h holds items of weight 2**h. A level over its capacity is sorted and
+    every other item (random offset) is promoted to the next level, so memory
+    stays O(k log n) while rank error stays around 1.7 / k.
+    """
+
+    def __init__(self, k=200, chunk_size=65536, seed=None):
+        self.k = k
+        self.chunk_size = chunk_size
+        self.n = 0
+        self.levels = [np.empty(0, dtype=np.float64)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        while True:
+            over = [h for h, items in enumerate(self.levels) if len(items) > self._capacity(h)]
+            if not over:
+                return
+            level = over[0]
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0, dtype=np.float64))
+            items = np.sort(self.levels[level])
+            # An odd item out stays behind so total weight is preserved exactly
+            keep, items = (items[:1], items[1:]) if len(items) % 2 else (items[:0], items)
+            promoted = items[self._rng.integers(2)::2]
+            self.levels[level] = keep
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        # Chunked so a large batch never sits fully sorted in level 0
+        for start in range(0, len(values), self.chunk_size):
+            chunk = values[start:start + self.chunk_size]
+            self.levels[0] = np.concatenate([self.levels[0], chunk])
+            self.n += len(chunk)
+            self._compress()
+        return self
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0, dtype=np.float64))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def quantiles(self, qs):
+        """Approximate values at the given quantile fractions"""
+        qs = np.asarray(qs, dtype=np.float64)
+        if self.n == 0:
+            return np.full(qs.shape, np.nan)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** h) for h, items in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        cumulative = np.cumsum(weights[order])
+        ranks = np.searchsorted(cumulative, qs * cumulative[-1], side='left')
+        return items[order][np.minimum(ranks, len(items) - 1)]
+
+
+class DistinctCountCube:
+    """HyperLogLog registers per day x category x location cell, kept only for cells with orders.
+
+    Any combination of a day window and category/location filters is answered
+    by max-merging the selected cells, without touching the orders. Unfiltered
+    windows read a per-day rollup with a running prefix union instead, rebuilt
+    lazily after writes.
+    """
+
+    def __init__(self, precision=10):
+        self.precision = precision
+        self.categories = KeyDictionary()
+        self.locations = KeyDictionary()
+        self._cell_rows = {}
+        # Day number, category code and location code of each cell, in creation order
+        self._cells = np.zeros((0, 3), dtype=np.int64)
+        self._registers = np.zeros((0, 1 << precision), dtype=np.uint8)
+        self._n_cells = 0
+        self._rollup = None
+
+    @property
+    def relative_error(self):
+        return 1.04 / np.sqrt(1 << self.precision)
+
+    @property
+    def nbytes(self):
+        rollup = self._rollup[1].nbytes + self._rollup[2].nbytes if self._rollup is not None else 0
+        return self._registers.nbytes + self._cells.nbytes + rollup
+
+    def _row(self, cell):
+        """Register row of a (day, category, location) cell, allocated on first use"""
+        row = self._cell_rows.get(cell)
+        if row is None:
+            row = self._n_cells
+            if row == len(self._registers):
+                # Capacity doubles, so allocating cells stays amortized O(1)
+                grow = max(16, row)
+                self._registers = np.pad(self._registers, ((0, grow), (0, 0)))
+                self._cells = np.pad(self._cells, ((0, grow), (0, 0)))
+            self._cells[row] = cell
+            self._cell_rows[cell] = row
+            self._n_cells += 1
+        return row
+
+    def add(self, order_dates, categories, locations, customer_codes):
+        """Fold a batch of orders into the cube"""
+        days = np.asarray(order_dates).astype('datetime64[D]').astype(np.int64)
+        if len(days) == 0:
+            return
+        coords = np.stack([days, self.categories.encode(categories), self.locations.encode(locations)], axis=1)
+        cells, inverse = np.unique(coords, axis=0, return_inverse=True)
+        rows = np.array([self._row(cell) for cell in map(tuple, cells.tolist())], dtype=np.int64)
+
+        m = self._registers.shape[1]
+        index, rank = hll_positions(splitmix64(customer_codes), self.precision)
+        hll_update(self._registers.reshape(-1), rows[inverse.ravel()] * m + index, rank)
+        self._rollup = None
+
+    def _day_rollup(self):
+        """Days with orders, their merged registers and the running union up to each day"""
+        if self._rollup is None:
+            cells, registers = self._cells[:self._n_cells], self._registers[:self._n_cells]
+            order = np.argsort(cells[:, 0], kind='stable')
+            day_numbers = cells[order, 0]
+            starts = np.flatnonzero(np.r_[True, day_numbers[1:] != day_numbers[:-1]]) if len(order) else order
+            per_day = np.maximum.reduceat(registers[order], starts, axis=0) if len(order) else registers
+            days = day_numbers[starts].astype('datetime64[D]')
+            self._rollup = (days, per_day, np.maximum.accumulate(per_day, axis=0))
+        return self._rollup
+
+    def _select(self, dictionary, values):
+        codes = np.array([dictionary.lookup(value) for value in values], dtype=np.int64)
+        return codes[codes >= 0]
+
+    def estimate(self, start=None, end=None, categories=None, locations=None, group_by=None):
+        """Approximate distinct customers for a day window and optional dimension filters.
+
+        group_by ('category' or 'location') returns one estimate per value instead of a total.
+        """
+        if group_by not in (None, 'category', 'location'):
+            raise ValueError(f"Cannot group distinct counts by '{group_by}'")
+
+        if group_by is None and categories is None and locations is None:
+            days, per_day, prefix = self._day_rollup()
+            lo = 0 if start is None else int(np.searchsorted(days, np.datetime64(start, 'D'), side='left'))
+            hi = len(days) if end is None else int(np.searchsorted(days, np.datetime64(end, 'D'), side='right'))
+            if hi <= lo:
+                return 0
+            merged = prefix[hi - 1] if lo == 0 else per_day[lo:hi].max(axis=0)
+            return int(round(float(hll_estimate(merged))))
+
+        cells = self._cells[:self._n_cells]
+        mask = np.ones(len(cells), dtype=bool)
+        if start is not None:
+            mask &= cells[:, 0] >= np.datetime64(start, 'D').astype(np.int64)
+        if end is not None:
+            mask &= cells[:, 0] <= np.datetime64(end, 'D').astype(np.int64)
+        if categories is not None:
+            mask &= np.isin(cells[:, 1], self._select(self.categories, categories))
+        if locations is not None:
+            mask &= np.isin(cells[:, 2], self._select(self.locations, locations))
+        registers = self._registers[:self._n_cells][mask]
+
+        if group_by is None:
+            return int(round(float(hll_estimate(registers.max(axis=0))))) if len(registers) else 0
+
+        if len(registers) == 0:
+            return {}
+        if group_by == 'category':
+            column, dictionary, values = 1, self.categories, categories
+        else:
+            column, dictionary, values = 2, self.locations, locations
+        grouped = np.zeros((len(dictionary), registers.shape[1]), dtype=np.uint8)
+        np.maximum.at(grouped, cells[mask, column], registers)
+        codes = np.arange(len(dictionary)) if values is None else self._select(dictionary, values)
+        estimates = hll_estimate(grouped[codes])
+        return {
+            str(name): int(round(float(value)))
+            for name, value in zip(dictionary.decode(codes), estimates)
+        }
@@ -0,0 +1,90 @@
+"""Memory and latency comparison of string-keyed vs compact DataService tables.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_compact_storage --rows 5000000
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from app.utils.key_dictionary import KeyDictionary
+
+
+def build_string_tables(n_rows, n_customers, seed=42):
+    """Orders and customers as the original generator laid them out: string IDs, object columns"""
+    rng = np.random.default_rng(seed)
+    customer_ids = np.array([f"CUST_{i:05d}" for i in range(1, n_customers + 1)], dtype=object)
+    categories = np.array(['Electronics', 'Clothing', 'Books', 'Home', 'Sports'], dtype=object)
+    locations = np.array(['New York', 'California', 'Texas', 'Florida', 'Illinois'], dtype=object)
+
+    orders = pd.DataFrame({
+        'order_id': np.array([f"ORD_{i:06d}" for i in range(1, n_rows + 1)], dtype=object),
+        'customer_id': customer_ids[rng.integers(0, n_customers, n_rows)],
+        'order_date': pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 365, n_rows), unit='D'),
+        'total_amount': np.round(np.maximum(10, rng.lognormal(4, 0.8, n_rows)), 2),
+        'product_category': categories[rng.integers(0, len(categories), n_rows)]
+    })
+    customers = pd.DataFrame({
+        'customer_id': customer_ids,
+        'gender': np.array(['M', 'F'], dtype=object)[rng.integers(0, 2, n_customers)],
+        'location': locations[rng.integers(0, len(locations), n_customers)]
+    })
+    return orders, customers
+
+
+def compact_tables(orders, customers):
+    """Apply the DataService compact encoding to string-keyed tables"""
+    customer_keys = KeyDictionary()
+    compact_customers = customers.assign(
+        customer_id=customer_keys.encode(customers['customer_id']),
+        gender=customers['gender'].astype('category'),
+        location=customers['location'].astype('category')
+    )
+    compact_orders = orders.assign(
+        order_id=KeyDictionary().encode(orders['order_id']),
+        customer_id=customer_keys.encode(orders['customer_id'], add=False),
+        total_amount=orders['total_amount'].astype(np.float32),
+        product_category=orders['product_category'].astype('category')
+    )
+    return compact_orders, compact_customers, customer_keys
+
+
+def timed(fn, repeat=3):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(n_rows, n_customers):
+    orders, customers = build_string_tables(n_rows, n_customers)
+    start = time.perf_counter()
+    compact_orders, compact_customers, customer_keys = compact_tables(orders, customers)
+    encode_time = time.perf_counter() - start
+
+    results = []
+    for label, o, c in [('string', orders, customers), ('compact', compact_orders, compact_customers)]:
+        results.append({
+            'layout': label,
+            'orders_mb': o.memory_usage(deep=True).sum() / 1e6,
+            'customers_mb': c.memory_usage(deep=True).sum() / 1e6,
+            'groupby_customer_s': timed(lambda: o.groupby('customer_id')['total_amount'].agg(['sum', 'count'])),
+            'groupby_category_s': timed(lambda: o.groupby('product_category', observed=True)['total_amount'].sum()),
+            'merge_s': timed(lambda: o[['customer_id', 'total_amount']].merge(c, on='customer_id', how='left'))
+        })
+
+    decode_time = timed(lambda: customer_keys.decode(compact_orders['customer_id'].to_numpy()[:100000]))
+
+    print(f"rows={n_rows:,} customers={n_customers:,} encode={encode_time:.2f}s decode(100k)={decode_time * 1000:.1f}ms")
+    print(pd.DataFrame(results).set_index('layout').round(3).to_string())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--customers', type=int, default=100000)
+    args = parser.parse_args()
+    run(args.rows, args.customers)
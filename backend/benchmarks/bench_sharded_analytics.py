@@ -0,0 +1,78 @@
+"""Throughput of sharded churn scoring and segmentation as the shard count grows.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_sharded_analytics --customers 1000000 --orders 10000000
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from app.models.churn_prediction import ChurnPredictor
+from app.models.customer_segmentation import CustomerSegmentation
+from app.services.sharded_analytics import ShardedAnalytics
+
+
+def build_tables(n_customers, n_orders, seed=42):
+    """Synthetic compact customer and order tables shaped like DataService output"""
+    rng = np.random.default_rng(seed)
+    reference = np.datetime64('2025-12-31', 'us')
+    orders = pd.DataFrame({
+        'order_id': np.arange(n_orders, dtype=np.int64),
+        'customer_id': rng.integers(0, n_customers, n_orders),
+        'order_date': reference - rng.integers(0, 365, n_orders).astype('timedelta64[D]'),
+        'total_amount': np.maximum(10, rng.lognormal(4, 0.8, n_orders)).astype(np.float32)
+    })
+
+    amounts = orders['total_amount'].astype(np.float64).groupby(orders['customer_id'])
+    dates = orders['order_date'].groupby(orders['customer_id'])
+    stats = pd.DataFrame({
+        'total_spent': amounts.sum(),
+        'order_count': amounts.count(),
+        'first_order': dates.min(),
+        'last_order': dates.max()
+    }).reindex(np.arange(n_customers))
+
+    customers = pd.DataFrame({
+        'customer_id': np.arange(n_customers, dtype=np.int64),
+        'age': rng.integers(18, 70, n_customers),
+        'gender': pd.Categorical(np.array(['F', 'M'])[rng.integers(0, 2, n_customers)]),
+        'total_spent': stats['total_spent'].fillna(0).to_numpy(),
+        'order_count': stats['order_count'].fillna(0).astype(np.int64).to_numpy(),
+        'days_since_last_order': (pd.Timestamp(reference) - stats['last_order']).dt.days.fillna(0).to_numpy(),
+        'customer_lifetime_days': (stats['last_order'] - stats['first_order']).dt.days.fillna(0).to_numpy()
+    })
+    customers['avg_order_value'] = customers['total_spent'] / customers['order_count'].clip(lower=1)
+    customers['is_churned'] = customers['days_since_last_order'] > 60
+    return customers, orders
+
+
+def run(n_customers, n_orders, shard_counts):
+    customers, orders = build_tables(n_customers, n_orders)
+    churn_predictor = ChurnPredictor()
+    churn_predictor.train(customers.sample(min(len(customers), 100000), random_state=0))
+    segmentation = CustomerSegmentation()
+    segmentation.train(customers.sample(min(len(customers), 100000), random_state=0))
+
+    print(f"customers={n_customers:,} orders={n_orders:,}")
+    baseline = None
+    for n_shards in shard_counts:
+        sharded = ShardedAnalytics(n_shards=n_shards)
+        sharded.run(customers.head(1000), orders[orders['customer_id'] < 1000], churn_predictor, segmentation)  # warm the pool
+        start = time.perf_counter()
+        summary = sharded.run(customers, orders, churn_predictor, segmentation)
+        elapsed = time.perf_counter() - start
+        sharded.shutdown()
+
+        baseline = baseline or elapsed
+        print(f"shards={n_shards:>2} time={elapsed:6.2f}s customers/s={summary.n_customers / elapsed:12,.0f} "
+              f"speedup={baseline / elapsed:4.2f}x churn_rate={summary.churn_rate:.4f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--customers', type=int, default=200000)
+    parser.add_argument('--orders', type=int, default=2000000)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+    run(args.customers, args.orders, args.shards)
@@ -23,8 +23,18 @@ const Dashboard = () => {
     loadDashboardData();
   }, []);
 
+  useEffect(() => {
+    const unsubscribe = apiService.subscribeDashboardUpdates((panels) => {
+      if (panels.overview) {
+        setOverview((previous) => ({ ...previous, ...panels.overview }));
+      }
+    });
+    return unsubscribe;
+  }, []);
+
   const loadDashboardData = async () => {
     try {
+      apiService.loadDashboardBundle();
       const data = await apiService.getDashboardOverview();
       setOverview(data);
     } catch (error) {
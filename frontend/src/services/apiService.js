@@ -8,29 +8,111 @@ class ApiService {
       baseURL: `${API_BASE_URL}/api/v1`,
       timeout: 30000,
     });
+    this.bundle = {};
+    this.bundlePeriods = null;
+  }
+
+  // Opens one streamed /dashboard/all request; panel getters below resolve
+  // from it as each panel line arrives instead of issuing their own requests
+  loadDashboardBundle(periods = 30) {
+    const panels = ['overview', 'forecast', 'segmentation', 'sentiment', 'churn'];
+    const resolvers = {};
+    this.bundlePeriods = periods;
+    panels.forEach((panel) => {
+      this.bundle[panel] = new Promise((resolve, reject) => {
+        resolvers[panel] = { resolve, reject };
+      });
+      this.bundle[panel].catch(() => {});
+    });
+
+    const settle = (message) => {
+      const resolver = resolvers[message.panel];
+      if (!resolver) return;
+      if (message.error) {
+        resolver.reject(new Error(message.error));
+      } else {
+        resolver.resolve(message.data);
+      }
+      delete resolvers[message.panel];
+    };
+
+    const controller = new AbortController();
+    const timer = setTimeout(() => controller.abort(), 30000);
+
+    fetch(`${API_BASE_URL}/api/v1/dashboard/all?periods=${periods}`, { signal: controller.signal })
+      .then(async (response) => {
+        if (!response.ok) throw new Error(`Dashboard request failed: ${response.status}`);
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        for (;;) {
+          const { done, value } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+          const lines = buffer.split('\n');
+          buffer = lines.pop();
+          lines.filter((line) => line.trim()).forEach((line) => settle(JSON.parse(line)));
+        }
+        if (buffer.trim()) settle(JSON.parse(buffer));
+      })
+      .catch((error) => {
+        Object.values(resolvers).forEach(({ reject }) => reject(error));
+      })
+      .finally(() => {
+        clearTimeout(timer);
+        Object.keys(resolvers).forEach((panel) => {
+          resolvers[panel].reject(new Error(`Panel ${panel} missing from dashboard stream`));
+        });
+      });
+  }
+
+  // Server-sent events: 'snapshot' carries every pushed panel, 'update' only the
+  // changed fields of changed panels. Returns a function that closes the stream.
+  subscribeDashboardUpdates(onPanels) {
+    const source = new EventSource(`${API_BASE_URL}/api/v1/dashboard/stream`);
+    const handle = (event) => onPanels(JSON.parse(event.data).panels);
+    source.addEventListener('snapshot', handle);
+    source.addEventListener('update', handle);
+    return () => source.close();
+  }
+
+  takeBundledPanel(panel) {
+    const pending = this.bundle[panel];
+    delete this.bundle[panel];
+    return pending;
   }
 
   async getDashboardOverview() {
+    const bundled = this.takeBundledPanel('overview');
+    if (bundled) return bundled;
     const response = await this.api.get('/dashboard/overview');
     return response.data;
   }
 
   async getSalesForecasting(periods = 30) {
+    const bundled = this.takeBundledPanel('forecast');
+    if (bundled && periods === this.bundlePeriods) return bundled;
     const response = await this.api.get(`/forecast/sales?periods=${periods}`);
     return response.data;
   }
 
   async getCustomerSegmentation() {
+    const bundled = this.takeBundledPanel('segmentation');
+    if (bundled) return bundled;
     const response = await this.api.get('/segmentation/customers');
     return response.data;
   }
 
   async getSentimentAnalysis() {
+    const bundled = this.takeBundledPanel('sentiment');
+    if (bundled) return bundled;
     const response = await this.api.get('/sentiment/analysis');
     return response.data;
   }
 
   async getChurnPrediction() {
+    const bundled = this.takeBundledPanel('churn');
+    if (bundled) return bundled;
     const response = await this.api.get('/churn/prediction');
     return response.data;
   }